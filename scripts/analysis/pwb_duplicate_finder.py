@@ -4,12 +4,28 @@
 import pywikibot
 from pywikibot import pagegenerators
 import os
+import sqlite3
+import multiprocessing
 import requests
 from io import BytesIO
 from PIL import Image
 import imagehash
-import shutil
-import tempfile
+import numpy as np
+from itertools import combinations
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+
+try:
+    import pyvips  # Optional: faster decode and downscale for hashing
+except ImportError:
+    pyvips = None
+
+try:
+    import numba  # Optional: compiled pairwise comparison for medium categories
+    from numba import types
+    from numba.extending import intrinsic
+except ImportError:
+    numba = None
 
 """
 pwb_duplicate_finder.py - Finds duplicate or similar images in your uploads
@@ -19,6 +35,8 @@ helping to find potential duplicates in your uploads.
 
 Requirements:
     pip install pillow imagehash numpy
+    pip install pyvips  # optional, speeds up hashing (needs libvips)
+    pip install numba   # optional, speeds up comparing medium-sized categories
 
 Usage:
     python pwb_duplicate_finder.py
@@ -32,85 +50,344 @@ category = pywikibot.Category(site, 'Category:YOUR_UPLOADS_CATEGORY')
 # Values between 0-64, where 0 is identical and 64 is completely different
 HASH_THRESHOLD = 8  
 
-# Temp directory for downloaded images
-TEMP_DIR = tempfile.mkdtemp()
+# Width of the thumbnail downloaded for hashing; the hash only looks at a
+# 9×8 downscale, so the full-resolution original is never needed
+HASH_IMAGE_WIDTH = 512
+
+# Number of titles per batched imageinfo API request
+API_BATCH_SIZE = 50
+
+# Maximum download size per image (only thumbnails are needed for hashing)
+MAX_DOWNLOAD_BYTES = 8 * 1024 * 1024
+
+# Number of parallel image downloads
+MAX_WORKERS = 24
+
+# Images handed to a hashing process at once (amortizes pickling overhead)
+HASH_CHUNK_SIZE = 32
+
+# Tile size for the pairwise hash comparison (bounds memory per tile)
+COMPARE_BLOCK_SIZE = 2048
+
+# From this many images on, use the compiled comparison (if numba is installed)
+NUMBA_MIN_FILES = 2000
 
-def download_image(image_url, filename):
-    """Download the image and save to temp location."""
-    headers = {
-        'User-Agent': 'YOUR_USERNAME/1.0 (https://meta.wikimedia.org/wiki/User-Agent_policy)'
-    }
+# From this many images on, use a BK-tree instead of the all-pairs comparison
+BKTREE_MIN_FILES = 20000
+
+# Persistent cache of perceptual hashes, keyed by the file's SHA1 on Commons
+CACHE_FILE = os.path.expanduser('~/.cache/pwb_dhash.db')
+CACHE_COMMIT_INTERVAL = 500  # Commit cached hashes every N files
+
+# Number of set bits for every byte value, used to popcount XORed hashes
+POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+# Shared HTTP session so connections are reused across download threads
+session = requests.Session()
+session.headers.update({
+    'User-Agent': 'YOUR_USERNAME/1.0 (https://meta.wikimedia.org/wiki/User-Agent_policy)'
+})
+session.mount('https://', HTTPAdapter(pool_connections=32, pool_maxsize=32))
+
+def fetch_thumbnail_urls(titles, width):
+    """Fetch thumbnail URLs for many files, one imageinfo request per batch."""
+    thumb_urls = {}
+    for start in range(0, len(titles), API_BATCH_SIZE):
+        batch = titles[start:start + API_BATCH_SIZE]
+        request = site.simple_request(action='query', prop='imageinfo', iiprop='url',
+                                      iiurlwidth=width, titles=batch, formatversion=2)
+        data = request.submit()
+        for page in data.get('query', {}).get('pages', []):
+            imageinfo = page.get('imageinfo')
+            if imageinfo:
+                thumb_urls[page['title']] = imageinfo[0].get('thumburl', imageinfo[0]['url'])
+    return thumb_urls
+
+def download_image(image_url):
+    """Download the image into memory, giving up on files over MAX_DOWNLOAD_BYTES."""
     try:
-        response = requests.get(image_url, headers=headers, stream=True)
-        if response.status_code == 200:
-            file_path = os.path.join(TEMP_DIR, filename)
-            with open(file_path, 'wb') as f:
-                f.write(response.content)
-            return file_path
-        else:
-            print(f"Error downloading image: Status Code {response.status_code}")
-            return None
+        with session.get(image_url, stream=True, timeout=(5, 30)) as response:
+            response.raise_for_status()
+            image_data = bytearray()
+            for chunk in response.iter_content(65536):
+                image_data.extend(chunk)
+                if len(image_data) > MAX_DOWNLOAD_BYTES:
+                    print(f"Skipping image larger than {MAX_DOWNLOAD_BYTES // (1024 * 1024)} MB: {image_url}")
+                    return None
+            return bytes(image_data)
     except Exception as e:
         print(f"Error downloading image: {str(e)}")
         return None
 
-def compute_image_hash(image_path):
-    """Compute perceptual hash for the image."""
+def hash_to_int(img_hash):
+    """Convert a 64-bit image hash to a plain integer."""
+    return int(str(img_hash), 16)
+
+def compute_image_hash(image_data):
+    """Compute the difference hash of the image as an integer.
+    
+    Difference hash compares neighbouring pixels of a 9×8 grayscale
+    thumbnail; it is much cheaper than the DCT of phash and as good for
+    finding near-duplicates.
+    """
     try:
-        img = Image.open(image_path)
+        if pyvips is not None:
+            # libvips decodes and shrinks in a single streaming pass, so the
+            # full-resolution image is never held in memory
+            thumb = pyvips.Image.thumbnail_buffer(image_data, 9, height=8, size='force')
+            pixels = thumb.colourspace('b-w')[0].numpy()
+            diff = pixels[:, 1:] > pixels[:, :-1]
+            return int.from_bytes(np.packbits(diff).tobytes(), 'big')
+        
+        img = Image.open(BytesIO(image_data))
         # Converting to grayscale for more stable hashing
         if img.mode != 'L':  # L means grayscale
             img = img.convert('L')
-        # Using a combination of hash types for better accuracy
-        phash = imagehash.phash(img)
-        return phash
+        return hash_to_int(imagehash.dhash(img, hash_size=8))
     except Exception as e:
         print(f"Error computing hash: {str(e)}")
         return None
 
+def hash_worker(item):
+    """Hash downloaded image data in a worker process.
+    
+    Takes (title, sha1, image_data) and returns (title, sha1, hash), with the
+    hash as an integer or None if the image couldn't be hashed.
+    """
+    file_title, sha1, image_data = item
+    return file_title, sha1, compute_image_hash(image_data)
+
+def iter_downloads(downloads):
+    """Download images in parallel, yielding (title, sha1, image_data) as they arrive."""
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = {
+            executor.submit(download_image, image_url): (file_title, sha1)
+            for file_title, image_url, sha1 in downloads
+        }
+        for future in as_completed(futures):
+            image_data = future.result()
+            if image_data is not None:
+                file_title, sha1 = futures[future]
+                yield file_title, sha1, image_data
+
+def open_hash_cache():
+    """Open (and create if needed) the persistent SHA1 -> hash cache."""
+    os.makedirs(os.path.dirname(CACHE_FILE), exist_ok=True)
+    cache = sqlite3.connect(CACHE_FILE)
+    cache.execute("CREATE TABLE IF NOT EXISTS cache (sha1 TEXT PRIMARY KEY, dhash TEXT)")
+    return cache
+
+def find_pairs_vectorized(titles, hashes):
+    """Find all pairs of hashes within HASH_THRESHOLD using NumPy."""
+    arr = np.array(hashes, dtype=np.uint64)
+    n = len(arr)
+    pairs = []
+    
+    # Compare tile by tile over the upper triangle of the distance matrix
+    for row_start in range(0, n, COMPARE_BLOCK_SIZE):
+        rows = arr[row_start:row_start + COMPARE_BLOCK_SIZE]
+        for col_start in range(row_start, n, COMPARE_BLOCK_SIZE):
+            cols = arr[col_start:col_start + COMPARE_BLOCK_SIZE]
+            
+            # Hamming distance = number of set bits in the XOR of two hashes
+            xor = rows[:, None] ^ cols[None, :]
+            dist = POPCOUNT_TABLE[xor.view(np.uint8)].reshape(len(rows), len(cols), 8).sum(axis=-1)
+            
+            for i, j in np.argwhere(dist <= HASH_THRESHOLD):
+                index1 = row_start + i
+                index2 = col_start + j
+                if index1 < index2:
+                    pairs.append((titles[index1], titles[index2], int(dist[i, j])))
+    
+    return pairs
+
+if numba is not None:
+    @intrinsic
+    def popcount64(typingctx, value):
+        """Count set bits with LLVM's ctpop (a single POPCNT instruction on x86)."""
+        def codegen(context, builder, signature, args):
+            return builder.ctpop(args[0])
+        return types.uint64(types.uint64), codegen
+    
+    @numba.njit(parallel=True, cache=True)
+    def count_close_pairs(hashes, threshold):
+        """Count, per hash, the later hashes within threshold."""
+        n = len(hashes)
+        counts = np.zeros(n, dtype=np.int64)
+        for i in numba.prange(n):
+            count = 0
+            for j in range(i + 1, n):
+                if np.int64(popcount64(hashes[i] ^ hashes[j])) <= threshold:
+                    count += 1
+            counts[i] = count
+        return counts
+    
+    @numba.njit(parallel=True, cache=True)
+    def fill_close_pairs(hashes, threshold, offsets, out):
+        """Write (i, j, distance) rows for close pairs, starting at offsets[i]."""
+        n = len(hashes)
+        for i in numba.prange(n):
+            k = offsets[i]
+            for j in range(i + 1, n):
+                distance = np.int64(popcount64(hashes[i] ^ hashes[j]))
+                if distance <= threshold:
+                    out[k, 0] = i
+                    out[k, 1] = j
+                    out[k, 2] = distance
+                    k += 1
+
+def find_pairs_numba(titles, hashes):
+    """Find all pairs of hashes within HASH_THRESHOLD with compiled loops."""
+    arr = np.array(hashes, dtype=np.uint64)
+    
+    # Count first so every row can be filled in parallel without locking
+    counts = count_close_pairs(arr, HASH_THRESHOLD)
+    offsets = np.zeros(len(arr), dtype=np.int64)
+    offsets[1:] = np.cumsum(counts)[:-1]
+    out = np.empty((int(counts.sum()), 3), dtype=np.int64)
+    fill_close_pairs(arr, HASH_THRESHOLD, offsets, out)
+    
+    return [(titles[i], titles[j], int(distance)) for i, j, distance in out]
+
+def hamming_distance(hash1, hash2):
+    """Number of differing bits between two integer hashes."""
+    return bin(hash1 ^ hash2).count('1')
+
+def build_bktree(hashes):
+    """Build a BK-tree over integer hashes.
+    
+    Each node is a tuple (hash, [indices], {distance: child_node}).
+    """
+    root = None
+    for index, value in enumerate(hashes):
+        if root is None:
+            root = (value, [index], {})
+            continue
+        
+        node = root
+        while True:
+            distance = hamming_distance(value, node[0])
+            if distance == 0:
+                node[1].append(index)
+                break
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = (value, [index], {})
+                break
+            node = child
+    
+    return root
+
+def query_bktree(root, value, radius):
+    """Return (index, distance) for every hash in the tree within radius of value."""
+    matches = []
+    stack = [root] if root is not None else []
+    while stack:
+        node_value, indices, children = stack.pop()
+        distance = hamming_distance(value, node_value)
+        if distance <= radius:
+            matches.extend((index, distance) for index in indices)
+        # Triangle inequality: only subtrees in this distance band can match
+        for child_distance, child in children.items():
+            if distance - radius <= child_distance <= distance + radius:
+                stack.append(child)
+    return matches
+
+def find_pairs_bktree(titles, hashes):
+    """Find all pairs of hashes within HASH_THRESHOLD using a BK-tree."""
+    root = build_bktree(hashes)
+    pairs = []
+    for index1, value in enumerate(hashes):
+        for index2, distance in query_bktree(root, value, HASH_THRESHOLD):
+            # Each unordered pair is reported once
+            if index1 < index2:
+                pairs.append((titles[index1], titles[index2], distance))
+    return pairs
+
 def find_similar_images(files):
     """Find similar images using perceptual hashing."""
     print("Computing image hashes...")
     
-    # Dictionary to store file info: {filename: [filepath, hash]}
+    # Dictionary to store file info: {filename: hash}
     file_info = {}
     
-    # Compute hashes for all images
-    for i, file_page in enumerate(files):
-        if not file_page.exists() or file_page.namespace() != 6:
-            continue
+    cache = open_hash_cache()
+    try:
+        # Group files by SHA1; byte-identical files only need to be hashed once
+        sha1_buckets = {}
+        for file_page in files:
+            if not file_page.exists() or file_page.namespace() != 6:
+                continue
+            sha1 = file_page.latest_file_info.sha1
+            sha1_buckets.setdefault(sha1, []).append(file_page)
+        
+        # Collect the images that need hashing: (title, sha1)
+        to_hash = []
+        for sha1, file_pages in sha1_buckets.items():
+            file_title = file_pages[0].title()
+            
+            # Unchanged files are served from the cache without downloading
+            cached = cache.execute("SELECT dhash FROM cache WHERE sha1 = ?", (sha1,)).fetchone()
+            if cached:
+                file_info[file_title] = int(cached[0], 16)
+                continue
+            
+            to_hash.append((file_title, sha1))
         
-        file_title = file_page.title()
-        file_name = file_title.split(':', 1)[1]  # Remove 'File:' prefix
+        # Look up thumbnail URLs in batches: (title, url, sha1)
+        thumb_urls = fetch_thumbnail_urls([file_title for file_title, _ in to_hash], HASH_IMAGE_WIDTH)
+        downloads = [
+            (file_title, thumb_urls[file_title], sha1)
+            for file_title, sha1 in to_hash
+            if file_title in thumb_urls
+        ]
         
-        print(f"Processing {i+1}/{len(files)}: {file_title}")
+        print(f"{len(file_info)} hashes loaded from cache, {len(downloads)} images to download")
         
-        # Download the image
-        image_url = file_page.get_file_url()
-        file_path = download_image(image_url, file_name)
+        # Download images on a thread pool and hash them on all CPU cores as
+        # they arrive, so downloading and hashing overlap; image data never
+        # touches the disk
+        with multiprocessing.Pool(os.cpu_count()) as pool:
+            results = pool.imap_unordered(hash_worker, iter_downloads(downloads),
+                                          chunksize=HASH_CHUNK_SIZE)
+            for i, (file_title, sha1, img_hash) in enumerate(results):
+                print(f"Processing {i+1}/{len(downloads)}: {file_title}")
+                
+                if img_hash is not None:
+                    file_info[file_title] = img_hash
+                    cache.execute("INSERT OR REPLACE INTO cache (sha1, dhash) VALUES (?, ?)",
+                                  (sha1, format(img_hash, '016x')))
+                    if (i + 1) % CACHE_COMMIT_INTERVAL == 0:
+                        cache.commit()
         
-        if file_path:
-            # Compute hash
-            img_hash = compute_image_hash(file_path)
-            if img_hash:
-                file_info[file_title] = [file_path, img_hash]
+        cache.commit()
+    finally:
+        cache.close()
     
     # Find similar images
     print("\nSearching for similar images...")
-    similar_pairs = []
     
     # Compare all combinations of images
-    processed = set()
-    for title1, (path1, hash1) in file_info.items():
-        for title2, (path2, hash2) in file_info.items():
-            if title1 != title2 and (title2, title1) not in processed:
-                processed.add((title1, title2))
-                
-                # Calculate hash difference (0 = identical, high value = very different)
-                hash_diff = hash1 - hash2
-                
-                if hash_diff <= HASH_THRESHOLD:
-                    similar_pairs.append((title1, title2, hash_diff))
+    titles = list(file_info)
+    hashes = [file_info[title] for title in titles]
+    if len(hashes) >= BKTREE_MIN_FILES:
+        similar_pairs = find_pairs_bktree(titles, hashes)
+    elif numba is not None and len(hashes) >= NUMBA_MIN_FILES:
+        similar_pairs = find_pairs_numba(titles, hashes)
+    else:
+        similar_pairs = find_pairs_vectorized(titles, hashes)
+    
+    # Byte-identical files are exact duplicates of each other
+    for file_pages in sha1_buckets.values():
+        if len(file_pages) < 2:
+            continue
+        titles = [file_page.title() for file_page in file_pages]
+        for title1, title2 in combinations(titles, 2):
+            similar_pairs.append((title1, title2, 0))
+        # Count the duplicates as analyzed files with their representative's hash
+        if titles[0] in file_info:
+            for title in titles[1:]:
+                file_info[title] = file_info[titles[0]]
     
     # Sort by similarity (most similar first)
     similar_pairs.sort(key=lambda x: x[2])
@@ -121,7 +398,7 @@ def create_report(similar_pairs, file_info):
     """Create a report of similar images."""
     total_files = len(file_info)
     
-    report = f"""= Duplicate Image Detection Report =
+    parts = [f"""= Duplicate Image Detection Report =
 
 == Summary ==
 * Total files analyzed: {total_files}
@@ -131,51 +408,46 @@ def create_report(similar_pairs, file_info):
 == Similar Image Pairs ==
 The following pairs of images are visually similar and should be reviewed:
 
-"""
+"""]
     
     if not similar_pairs:
-        report += "No similar image pairs were found."
+        parts.append("No similar image pairs were found.")
     else:
         for i, (title1, title2, diff) in enumerate(similar_pairs):
-            report += f"=== Pair {i+1} (Difference: {diff}) ===\n"
-            report += f"* [[:{title1}]]\n"
-            report += f"* [[:{title2}]]\n\n"
+            parts.append(f"=== Pair {i+1} (Difference: {diff}) ===\n"
+                         f"* [[:{title1}]]\n"
+                         f"* [[:{title2}]]\n\n")
     
-    report += f"\nReport generated by pwb_duplicate_finder.py on ~~~~~"
+    parts.append(f"\nReport generated by pwb_duplicate_finder.py on ~~~~~")
     
-    return report
+    return "".join(parts)
 
 def main():
+    print("Starting duplicate image finder...")
+    
+    # Get all files from the category
+    print(f"Retrieving files from {category.title()}...")
+    files = list(pagegenerators.CategorizedPageGenerator(category, recurse=True))
+    print(f"Found {len(files)} files to process")
+    
+    # Find similar images
+    similar_pairs, file_info = find_similar_images(files)
+    
+    # Create report
+    report = create_report(similar_pairs, file_info)
+    
+    # Save report to user page
     try:
-        print("Starting duplicate image finder...")
-        
-        # Get all files from the category
-        print(f"Retrieving files from {category.title()}...")
-        files = list(pagegenerators.CategorizedPageGenerator(category, recurse=True))
-        print(f"Found {len(files)} files to process")
-        
-        # Find similar images
-        similar_pairs, file_info = find_similar_images(files)
-        
-        # Create report
-        report = create_report(similar_pairs, file_info)
-        
-        # Save report to user page
-        try:
-            user_page = pywikibot.Page(site, 'User:YOUR_USERNAME/pwb/Duplicate_Report')
-            user_page.text = report
-            user_page.save(summary="pwb: Updated duplicate image detection report")
-            print(f"Report saved to {user_page.title()}")
-        except Exception as e:
-            print(f"Error saving report: {e}")
-            print("Report content:")
-            print(report)
+        user_page = pywikibot.Page(site, 'User:YOUR_USERNAME/pwb/Duplicate_Report')
+        user_page.text = report
+        user_page.save(summary="pwb: Updated duplicate image detection report")
+        print(f"Report saved to {user_page.title()}")
+    except Exception as e:
+        print(f"Error saving report: {e}")
+        print("Report content:")
+        print(report)
     
-    finally:
-        # Clean up temporary files
-        print("Cleaning up temporary files...")
-        shutil.rmtree(TEMP_DIR, ignore_errors=True)
-        print("Done!")
+    print("Done!")
 
 if __name__ == "__main__":
     main()
@@ -4,13 +4,14 @@
 import pywikibot
 from pywikibot import pagegenerators
 import os
+import sqlite3
 import requests
 from io import BytesIO
 from PIL import Image, ImageStat
 import numpy as np
-import tempfile
-import shutil
 import cv2
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
 
 """
 pwb_quality_check.py - Analyzes image quality metrics
@@ -37,133 +38,183 @@ category = pywikibot.Category(site, 'Category:YOUR_UPLOADS_CATEGORY')
 MIN_RESOLUTION = 800  # Minimum width or height in pixels
 MIN_FILE_SIZE = 50 * 1024  # Minimum file size in bytes (50 KB)
 MAX_NOISE_LEVEL = 25  # Maximum acceptable noise level
-MIN_SHARPNESS = 30  # Minimum sharpness value
+MIN_SHARPNESS = 36  # Minimum sharpness value (Sobel gradient variance)
+MAX_BLOCKINESS = 0.1  # Maximum excess of 8×8 block-edge steps over in-block steps
 UNUSUAL_ASPECT_RATIOS = [0.1, 10.0]  # Very narrow or wide images
 
-# Temp directory for downloaded images
-TEMP_DIR = tempfile.mkdtemp()
+# Width of the rendition used for the pixel metrics. 0 analyzes the original
+# file; a thumbnail width (e.g. 1024) saves bandwidth, but noise and sharpness
+# are then measured at that scale and MAX_NOISE_LEVEL/MIN_SHARPNESS need
+# to be recalibrated, and resizing hides the JPEG block grid.
+ANALYSIS_WIDTH = 0
 
-def download_image(image_url, filename):
-    """Download the image and save to temp location."""
-    headers = {
-        'User-Agent': 'YOUR_USERNAME/1.0 (https://meta.wikimedia.org/wiki/User-Agent_policy)'
-    }
+# Number of titles per batched imageinfo API request
+API_BATCH_SIZE = 50
+
+# Maximum download size per image
+MAX_DOWNLOAD_BYTES = 50 * 1024 * 1024
+
+# Number of images analyzed in parallel
+MAX_WORKERS = 24
+
+# Persistent cache of quality metrics, keyed by the file's SHA1 on Commons
+# (bump the version when the metrics change so old values aren't reused)
+CACHE_FILE = os.path.expanduser('~/.cache/pwb_quality_v3.db')
+CACHE_COMMIT_INTERVAL = 500  # Commit cached metrics every N files
+
+# Shared HTTP session so connections are reused across worker threads
+session = requests.Session()
+session.headers.update({
+    'User-Agent': 'YOUR_USERNAME/1.0 (https://meta.wikimedia.org/wiki/User-Agent_policy)'
+})
+session.mount('https://', HTTPAdapter(pool_connections=32, pool_maxsize=32))
+
+def fetch_thumbnail_urls(titles, width):
+    """Fetch thumbnail URLs for many files, one imageinfo request per batch."""
+    thumb_urls = {}
+    for start in range(0, len(titles), API_BATCH_SIZE):
+        batch = titles[start:start + API_BATCH_SIZE]
+        request = site.simple_request(action='query', prop='imageinfo', iiprop='url',
+                                      iiurlwidth=width, titles=batch, formatversion=2)
+        data = request.submit()
+        for page in data.get('query', {}).get('pages', []):
+            imageinfo = page.get('imageinfo')
+            if imageinfo:
+                thumb_urls[page['title']] = imageinfo[0].get('thumburl', imageinfo[0]['url'])
+    return thumb_urls
+
+def download_image(image_url):
+    """Download the image into memory, giving up on files over MAX_DOWNLOAD_BYTES."""
     try:
-        response = requests.get(image_url, headers=headers, stream=True)
-        if response.status_code == 200:
-            file_path = os.path.join(TEMP_DIR, filename)
-            with open(file_path, 'wb') as f:
-                f.write(response.content)
-            file_size = len(response.content)
-            return file_path, file_size
-        else:
-            print(f"Error downloading image: Status Code {response.status_code}")
-            return None, 0
+        with session.get(image_url, stream=True, timeout=(5, 30)) as response:
+            response.raise_for_status()
+            image_data = bytearray()
+            for chunk in response.iter_content(65536):
+                image_data.extend(chunk)
+                if len(image_data) > MAX_DOWNLOAD_BYTES:
+                    print(f"Skipping image larger than {MAX_DOWNLOAD_BYTES // (1024 * 1024)} MB: {image_url}")
+                    return None
+            return bytes(image_data)
     except Exception as e:
         print(f"Error downloading image: {str(e)}")
-        return None, 0
+        return None
 
-def estimate_noise(image_path):
-    """Estimate the noise level in an image."""
+def decode_image(image_data):
+    """Decode downloaded image bytes into an OpenCV BGR array."""
+    return cv2.imdecode(np.frombuffer(image_data, np.uint8), cv2.IMREAD_COLOR)
+
+def split_into_blocks(arr, block_size):
+    """Split a 2-D array into flattened block_size×block_size blocks.
+    
+    Rows and columns that don't fill a whole block are cropped off.
+    """
+    rows, cols = arr.shape[0] // block_size, arr.shape[1] // block_size
+    cropped = arr[:rows * block_size, :cols * block_size]
+    blocks = cropped.reshape(rows, block_size, cols, block_size).swapaxes(1, 2)
+    return blocks.reshape(-1, block_size * block_size)
+
+def estimate_noise(gray, lap):
+    """Estimate the noise level from a grayscale image and its Laplacian."""
     try:
-        # Read image with OpenCV
-        img = cv2.imread(image_path)
-        if img is None:
-            return None
-        
-        # Convert to grayscale
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        
         # Calculate standard deviation in small blocks
         h, w = gray.shape
         block_size = min(64, min(h//4, w//4))  # Adjust block size for small images
         if block_size < 8:
             block_size = 8
+        if h < block_size or w < block_size:
+            return None
         
-        noise_levels = []
-        for y in range(0, h-block_size, block_size):
-            for x in range(0, w-block_size, block_size):
-                block = gray[y:y+block_size, x:x+block_size]
-                # Check if the block is relatively uniform (not edges or textures)
-                if np.std(block) < 15:  # Adjust threshold as needed
-                    noise = np.std(cv2.Laplacian(block, cv2.CV_64F))
-                    noise_levels.append(noise)
+        # Only use relatively uniform blocks (not edges or textures)
+        uniform = split_into_blocks(gray, block_size).std(axis=1) < 15  # Adjust threshold as needed
+        if not uniform.any():
+            return None
         
-        # Return average noise or None if no suitable blocks found
-        if noise_levels:
-            return np.mean(noise_levels)
-        return None
+        # Noise is the spread of the Laplacian within the uniform blocks
+        noise_levels = split_into_blocks(lap, block_size).std(axis=1)[uniform]
+        
+        return noise_levels.mean()
     except Exception as e:
         print(f"Error estimating noise: {str(e)}")
         return None
 
-def measure_sharpness(image_path):
-    """Measure image sharpness using Laplacian variance."""
+def measure_sharpness(gray):
+    """Measure image sharpness as the variance of the Sobel gradients."""
     try:
-        # Read image with OpenCV
-        img = cv2.imread(image_path)
-        if img is None:
-            return 0
-        
-        # Convert to grayscale
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        
-        # Compute Laplacian and variance
-        lap = cv2.Laplacian(gray, cv2.CV_64F)
-        lap_var = lap.var()
-        
-        return lap_var
+        # 16-bit gradients are exact for 8-bit input and a quarter the size of float64
+        gx = cv2.Sobel(gray, cv2.CV_16S, 1, 0, ksize=3)
+        gy = cv2.Sobel(gray, cv2.CV_16S, 0, 1, ksize=3)
+        return gx.var() + gy.var()
     except Exception as e:
         print(f"Error measuring sharpness: {str(e)}")
         return 0
 
-def check_compression_artifacts(image_path):
-    """Check for JPEG compression artifacts."""
+def check_compression_artifacts(gray):
+    """Check for JPEG compression artifacts in a grayscale image.
+    
+    JPEG encodes 8×8 blocks independently, so heavy compression shows up as
+    larger intensity steps across block boundaries than just inside them.
+    """
     try:
-        # Read image with OpenCV
-        img = cv2.imread(image_path)
-        if img is None:
+        h, w = gray.shape
+        if h < 16 or w < 16:
             return False
+        img = gray.astype(np.int16)
         
-        # Convert to YCrCb color space
-        ycrcb = cv2.cvtColor(img, cv2.COLOR_BGR2YCrCb)
-        
-        # Extract chroma channels
-        _, cr, cb = cv2.split(ycrcb)
-        
-        # Check for blockiness in chroma channels
-        cr_edges = cv2.Canny(cr, 50, 150)
-        cb_edges = cv2.Canny(cb, 50, 150)
-        
-        # Count edges and normalize by image size
-        h, w = cr.shape
-        edge_density = (np.sum(cr_edges) + np.sum(cb_edges)) / (h * w * 255)
+        # Steps across block boundaries (pixel 7 -> 8) and one pixel inside (6 -> 7)
+        boundary = (np.abs(img[:, 7:w-1:8] - img[:, 8::8]).mean() +
+                    np.abs(img[7:h-1:8, :] - img[8::8, :]).mean())
+        inside = (np.abs(img[:, 6:w-2:8] - img[:, 7:w-1:8]).mean() +
+                  np.abs(img[6:h-2:8, :] - img[7:h-1:8, :]).mean())
+        if inside == 0:
+            return False
         
-        # Higher edge density suggests more artifacts
-        return edge_density > 0.05  # Adjust threshold as needed
+        # Higher relative boundary steps suggest more blocking artifacts
+        return bool((boundary - inside) / inside > MAX_BLOCKINESS)
     except Exception as e:
         print(f"Error checking compression artifacts: {str(e)}")
         return False
 
-def analyze_image_quality(file_page):
-    """Analyze the quality of an image and return issues."""
+def measure_image(image_data):
+    """Measure the pixel-level quality metrics of an image.
+    
+    Returns a (noise_level, sharpness, has_artifacts) tuple, with all values
+    None if the image can't be decoded.
+    """
+    # Decode once and derive everything the pixel metrics need
+    img = decode_image(image_data)
+    if img is None:
+        return None, None, None
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    lap = cv2.Laplacian(gray, cv2.CV_16S)
+    
+    return estimate_noise(gray, lap), measure_sharpness(gray), check_compression_artifacts(gray)
+
+def analyze_image_quality(file_page, image_url=None, metrics=None):
+    """Analyze the quality of an image and return (issues, metrics).
+    
+    The image is downloaded from image_url. metrics is a (noise_level,
+    sharpness, has_artifacts) tuple that can be cached; passing it back in
+    skips downloading the image.
+    """
     issues = []
     
     try:
-        file_title = file_page.title()
-        file_name = file_title.split(':', 1)[1]  # Remove 'File:' prefix
-        
         # Get file info
         file_info = file_page.latest_file_info
         width = file_info.width
         height = file_info.height
+        file_size = file_info.size
         
-        # Download the image
-        image_url = file_page.get_file_url()
-        file_path, file_size = download_image(image_url, file_name)
+        if metrics is None:
+            # Download the image (or a thumbnail of it)
+            image_data = download_image(image_url) if image_url else None
+            
+            if not image_data:
+                return [f"Failed to download image for analysis"], None
+            
+            metrics = measure_image(image_data)
         
-        if not file_path:
-            return [f"Failed to download image for analysis"]
+        noise_level, sharpness, has_artifacts = metrics
         
         # Check resolution
         if width < MIN_RESOLUTION or height < MIN_RESOLUTION:
@@ -178,56 +229,111 @@ def analyze_image_quality(file_page):
         if aspect_ratio < UNUSUAL_ASPECT_RATIOS[0] or aspect_ratio > UNUSUAL_ASPECT_RATIOS[1]:
             issues.append(f"Unusual aspect ratio ({aspect_ratio:.2f})")
         
+        if sharpness is None:
+            issues.append("Could not decode image for pixel analysis")
+            return issues, metrics
+        
         # Check noise level
-        noise_level = estimate_noise(file_path)
         if noise_level and noise_level > MAX_NOISE_LEVEL:
             issues.append(f"High noise level ({noise_level:.2f})")
         
         # Check sharpness
-        sharpness = measure_sharpness(file_path)
         if sharpness < MIN_SHARPNESS:
             issues.append(f"Low sharpness/blurry ({sharpness:.2f})")
         
         # Check for compression artifacts
-        if check_compression_artifacts(file_path):
+        if has_artifacts:
             issues.append("Visible compression artifacts")
         
-        return issues
+        return issues, metrics
     
     except Exception as e:
-        return [f"Error analyzing image: {str(e)}"]
+        return [f"Error analyzing image: {str(e)}"], None
+
+def open_metrics_cache():
+    """Open (and create if needed) the persistent (SHA1, width) -> metrics cache."""
+    os.makedirs(os.path.dirname(CACHE_FILE), exist_ok=True)
+    cache = sqlite3.connect(CACHE_FILE)
+    cache.execute("""CREATE TABLE IF NOT EXISTS cache (
+        sha1 TEXT,
+        width INTEGER,
+        noise REAL,
+        sharpness REAL,
+        has_artifacts INTEGER,
+        PRIMARY KEY (sha1, width)
+    )""")
+    return cache
 
 def main():
+    print("Starting image quality checker...")
+    
+    # Get all files from the category
+    print(f"Retrieving files from {category.title()}...")
+    files = list(pagegenerators.CategorizedPageGenerator(category, recurse=True))
+    print(f"Found {len(files)} files to process")
+    
+    # Dictionary to store quality issues: {file_title: [issues]}
+    quality_issues = {}
+    
+    # Collect the files to analyze
+    file_pages = [
+        file_page for file_page in files
+        if file_page.exists() and file_page.namespace() == 6
+    ]
+    
+    cache = open_metrics_cache()
     try:
-        print("Starting image quality checker...")
+        # Look up cached metrics; unchanged files are not downloaded again
+        cached_metrics = {}
+        for file_page in file_pages:
+            sha1 = file_page.latest_file_info.sha1
+            cached_metrics[file_page.title()] = cache.execute(
+                "SELECT noise, sharpness, has_artifacts FROM cache WHERE sha1 = ? AND width = ?",
+                (sha1, ANALYSIS_WIDTH)
+            ).fetchone()
         
-        # Get all files from the category
-        print(f"Retrieving files from {category.title()}...")
-        files = list(pagegenerators.CategorizedPageGenerator(category, recurse=True))
-        print(f"Found {len(files)} files to process")
-        
-        # Dictionary to store quality issues: {file_title: [issues]}
-        quality_issues = {}
+        # Thumbnail URLs are looked up in batches; original URLs come with
+        # the imageinfo already loaded for the category members
+        if ANALYSIS_WIDTH:
+            uncached = [title for title, metrics in cached_metrics.items() if metrics is None]
+            image_urls = fetch_thumbnail_urls(uncached, ANALYSIS_WIDTH)
+        else:
+            image_urls = {file_page.title(): file_page.get_file_url() for file_page in file_pages}
         
-        # Process each file
-        for i, file_page in enumerate(files):
-            if not file_page.exists() or file_page.namespace() != 6:
-                continue
-            
-            file_title = file_page.title()
-            print(f"Processing {i+1}/{len(files)}: {file_title}")
+        # Analyze images in parallel, reporting results as they complete
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            futures = {}
+            for file_page in file_pages:
+                file_title = file_page.title()
+                cached = cached_metrics[file_title]
+                future = executor.submit(analyze_image_quality, file_page,
+                                         image_urls.get(file_title), cached)
+                futures[future] = (file_title, file_page.latest_file_info.sha1, cached is not None)
             
-            # Analyze image quality
-            issues = analyze_image_quality(file_page)
-            
-            if issues:
-                quality_issues[file_title] = issues
-                print(f"Issues found: {', '.join(issues)}")
-            else:
-                print("No quality issues detected")
+            for i, future in enumerate(as_completed(futures)):
+                file_title, sha1, was_cached = futures[future]
+                print(f"Processing {i+1}/{len(file_pages)}: {file_title}")
+                
+                issues, metrics = future.result()
+                
+                if metrics is not None and not was_cached:
+                    cache.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)",
+                                  (sha1, ANALYSIS_WIDTH) + metrics)
+                    if (i + 1) % CACHE_COMMIT_INTERVAL == 0:
+                        cache.commit()
+                
+                if issues:
+                    quality_issues[file_title] = issues
+                    print(f"Issues found: {', '.join(issues)}")
+                else:
+                    print("No quality issues detected")
         
-        # Create report
-        report = f"""= Image Quality Report =
+        cache.commit()
+    finally:
+        cache.close()
+    
+    # Create report
+    parts = [f"""= Image Quality Report =
 
 == Summary ==
 * Total files analyzed: {len(files)}
@@ -236,35 +342,31 @@ def main():
 == Files with Quality Issues ==
 The following files have potential quality issues:
 
-"""
-        
-        if quality_issues:
-            for title, issues in quality_issues.items():
-                report += f"=== {title} ===\n"
-                for issue in issues:
-                    report += f"* {issue}\n"
-                report += "\n"
-        else:
-            report += "No files with quality issues were found. Great job!"
-        
-        report += f"\nReport generated by pwb_quality_check.py on ~~~~~"
-        
-        # Save report to user page
-        try:
-            user_page = pywikibot.Page(site, 'User:YOUR_USERNAME/pwb/Quality_Report')
-            user_page.text = report
-            user_page.save(summary="pwb: Updated image quality report")
-            print(f"Report saved to {user_page.title()}")
-        except Exception as e:
-            print(f"Error saving report: {e}")
-            print("Report content:")
-            print(report)
+"""]
     
-    finally:
-        # Clean up temporary files
-        print("Cleaning up temporary files...")
-        shutil.rmtree(TEMP_DIR, ignore_errors=True)
-        print("Done!")
+    if quality_issues:
+        for title, issues in quality_issues.items():
+            parts.append(f"=== {title} ===\n")
+            parts.extend(f"* {issue}\n" for issue in issues)
+            parts.append("\n")
+    else:
+        parts.append("No files with quality issues were found. Great job!")
+    
+    parts.append(f"\nReport generated by pwb_quality_check.py on ~~~~~")
+    report = "".join(parts)
+    
+    # Save report to user page
+    try:
+        user_page = pywikibot.Page(site, 'User:YOUR_USERNAME/pwb/Quality_Report')
+        user_page.text = report
+        user_page.save(summary="pwb: Updated image quality report")
+        print(f"Report saved to {user_page.title()}")
+    except Exception as e:
+        print(f"Error saving report: {e}")
+        print("Report content:")
+        print(report)
+    
+    print("Done!")
 
 if __name__ == "__main__":
     main()
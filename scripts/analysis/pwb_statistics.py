@@ -4,14 +4,26 @@
 import pywikibot
 from pywikibot import pagegenerators
 import re
+import sqlite3
+import time
+import queue
+import threading
+from itertools import islice
 from datetime import datetime
+from functools import lru_cache
 from collections import Counter, defaultdict
-import matplotlib.pyplot as plt
+import numpy as np
 import os
-from PIL import Image
-from io import BytesIO
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import reverse_geocoder  # Optional: offline reverse geocoding instead of Nominatim
+except ImportError:
+    reverse_geocoder = None
 
 """
 pwb_statistics.py - Generate statistics about your uploads
@@ -25,7 +37,8 @@ This script analyzes your uploads and generates various statistics:
 - File sizes and resolutions
 
 Requirements:
-    pip install pillow matplotlib requests
+    pip install pillow matplotlib numpy requests
+    pip install reverse_geocoder  # Optional, avoids Nominatim requests
 
 Usage:
     python pwb_statistics.py
@@ -40,18 +53,113 @@ category = pywikibot.Category(site, f'Category:Files by {username}')  # Adjust a
 OUTPUT_DIR = './statistics'
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
+# Number of files processed in parallel
+MAX_WORKERS = 16
+
+# Bytes of the original read when only the image header is needed
+HEADER_BYTES = 256 * 1024
+
+# Maximum number of uploads analyzed
+MAX_FILES = 5000
+
+# Number of files queued for processing ahead of the aggregation
+QUEUE_SIZE = 64
+
+# Number of titles per API request when fetching file metadata
+API_BATCH_SIZE = 50
+
+# Persistent cache of reverse-geocoding results, keyed by rounded coordinates
+GEOCODE_CACHE_FILE = os.path.join(OUTPUT_DIR, 'geocache.sqlite')
+GEOCODE_PRECISION = 3  # Decimal places (~110 m), well below Nominatim's zoom=10
+NOMINATIM_DELAY = 1  # Seconds between live requests (Nominatim usage policy)
+
+# Shared HTTP session so connections are reused across requests
+session = requests.Session()
+session.headers.update({
+    'User-Agent': 'YOUR_USERNAME Wikipedia Bot/1.0'
+})
+session.mount('https://', HTTPAdapter(pool_connections=16, pool_maxsize=32,
+                                      max_retries=Retry(total=3, backoff_factor=1)))
+
+# Common aspect ratios and their names, sorted by ratio for searchsorted
+COMMON_RATIOS = {
+    1.0: "1:1",
+    1.33: "4:3",
+    1.5: "3:2",
+    1.78: "16:9",
+    1.85: "1.85:1",
+    2.35: "2.35:1",
+    0.67: "2:3",
+    0.75: "3:4",
+    0.56: "9:16"
+}
+RATIO_KEYS = np.array(sorted(COMMON_RATIOS))
+RATIO_NAMES = [COMMON_RATIOS[ratio] for ratio in sorted(COMMON_RATIOS)]
+RATIO_TOLERANCE = 0.05
+
+# Factors for converting minutes and seconds to decimal degrees
+INV_60 = 1 / 60
+INV_3600 = 1 / 3600
+
+# Precompiled patterns used for every file
+# Common date patterns: YYYY-MM-DD, YYYYMMDD, etc.
+DATE_PATTERNS = [
+    re.compile(r'(\d{4})-(\d{2})-(\d{2})'),  # YYYY-MM-DD
+    re.compile(r'(\d{4})(\d{2})(\d{2})'),     # YYYYMMDD
+    re.compile(r'(\d{2})-(\d{2})-(\d{4})'),   # DD-MM-YYYY
+    re.compile(r'(\d{2})(\d{2})(\d{4})')      # DDMMYYYY
+]
+
+# Date formats of the information template, each with a pattern matching
+# the strings it can parse so strptime is only tried where it may succeed
+DATE_FORMATS = [
+    (re.compile(r'\d{4}-\s?\d{1,2}-\s?\d{1,2}'), '%Y-%m-%d'),       # 2023-01-25
+    (re.compile(r'\s?\d{1,2}\s+[^\W\d_]+\s+\d{4}'), '%d %B %Y'),    # 25 January 2023
+    (re.compile(r'[^\W\d_]+\s+\d{1,2},\s+\d{4}'), '%B %d, %Y'),     # January 25, 2023
+    (re.compile(r'\d{4}/\s?\d{1,2}/\s?\d{1,2}'), '%Y/%m/%d'),       # 2023/01/25
+    (re.compile(r'\s?\d{1,2}/\s?\d{1,2}/\d{4}'), '%d/%m/%Y'),       # 25/01/2023
+    (re.compile(r'\d{4}\s+\d{1,2}\s+\d{1,2}'), '%Y %m %d'),         # 2023 01 25
+    (re.compile(r'\s?\d{1,2}\.\s?\d{1,2}\.\d{4}'), '%d.%m.%Y'),     # 25.01.2023
+    (re.compile(r'\d{4}'), '%Y')                                    # 2023
+]
+
+# All fields extracted from the page text, combined into one pattern so the
+# text is scanned only once. Each alternative is a lookahead, so matches
+# don't consume text and overlapping fields are still found. Camera and
+# lens patterns are listed in order of preference and are case-insensitive.
+CAMERA_PATTERNS = [
+    r'Camera:\s*(?P<camera_0>[^,\|\}\n]+)',
+    r'camera used[:\s]+(?P<camera_1>[^,\|\}\n]+)',
+    r'taken with[:\s]+(?P<camera_2>[^,\|\}\n]+)',
+    r'shot with[:\s]+(?P<camera_3>[^,\|\}\n]+)'
+]
+LENS_PATTERNS = [
+    r'Lens:\s*(?P<lens_0>[^,\|\}\n]+)',
+    r'lens used[:\s]+(?P<lens_1>[^,\|\}\n]+)',
+    r'(?P<lens_2>[0-9]+[-\s]*[0-9]*\s*mm\s*f\/[0-9\.]+)',  # Pattern like "24-70mm f/2.8"
+    r'(?P<lens_3>[0-9]+\s*mm\s*f\/[0-9\.]+)'               # Pattern like "50mm f/1.4"
+]
+TEXT_FIELDS_RE = re.compile('|'.join(
+    [
+        r'(?=\[\[Category:(?P<category>[^\]]+)\]\])',
+        r'(?=\|Date=(?P<date>[^\|\}]+))',
+        r'(?={{Location\s*\|(?P<location>[^}]+)}})',
+        r'(?={{Coord\|(?P<coord>[^}]+)}})'
+    ] +
+    [f'(?=(?i:{pattern}))' for pattern in CAMERA_PATTERNS + LENS_PATTERNS]
+))
+
+# Pages containing none of these substrings can only match categories, so
+# they are searched for categories alone. Camera and lens markers are
+# checked against the lowercased text as their patterns ignore case.
+FIELD_MARKERS = ('|Date=', '{{Location', '{{Coord')
+CAMERA_LENS_MARKERS = ('camera', 'taken with', 'shot with', 'lens', 'f/')
+CATEGORY_RE = re.compile(r'(?=\[\[Category:([^\]]+)\]\])')
+
 def extract_date_from_filename(filename):
     """Extract date from filename if it contains a date pattern."""
-    # Common date patterns: YYYY-MM-DD, YYYYMMDD, etc.
-    date_patterns = [
-        r'(\d{4})-(\d{2})-(\d{2})',  # YYYY-MM-DD
-        r'(\d{4})(\d{2})(\d{2})',     # YYYYMMDD
-        r'(\d{2})-(\d{2})-(\d{4})',   # DD-MM-YYYY
-        r'(\d{2})(\d{2})(\d{4})'      # DDMMYYYY
-    ]
-    
-    for pattern in date_patterns:
-        match = re.search(pattern, filename)
+    for pattern in DATE_PATTERNS:
+        match = pattern.search(filename)
         if match:
             groups = match.groups()
             if len(groups[0]) == 4:  # YYYY-MM-DD format
@@ -66,101 +174,88 @@ def extract_date_from_filename(filename):
     
     return None
 
-def extract_date_from_text(text):
-    """Extract date from file description or information template."""
+def scan_text(text):
+    """Scan the page text once for all fields.
+    
+    Returns a dict with the first match of each field and the list of
+    all categories.
+    """
+    if not any(marker in text for marker in FIELD_MARKERS):
+        lowered = text.lower()
+        if not any(marker in lowered for marker in CAMERA_LENS_MARKERS):
+            return {}, CATEGORY_RE.findall(text)
+    
+    fields = {}
+    categories = []
+    for match in TEXT_FIELDS_RE.finditer(text):
+        name = match.lastgroup
+        if name == 'category':
+            categories.append(match.group(name))
+        elif name not in fields:
+            fields[name] = match.group(name)
+    return fields, categories
+
+def extract_date_from_text(fields):
+    """Extract date from the information template fields."""
     # Look for date in information template
-    date_match = re.search(r'\|Date=([^\|\}]+)', text)
-    if date_match:
-        date_str = date_match.group(1).strip()
-        
-        # Try different date formats
-        date_formats = [
-            '%Y-%m-%d',          # 2023-01-25
-            '%d %B %Y',          # 25 January 2023
-            '%B %d, %Y',         # January 25, 2023
-            '%Y/%m/%d',          # 2023/01/25
-            '%d/%m/%Y',          # 25/01/2023
-            '%Y %m %d',          # 2023 01 25
-            '%d.%m.%Y',          # 25.01.2023
-            '%Y'                 # 2023
-        ]
+    if 'date' in fields:
+        date_str = fields['date'].strip()
         
-        for fmt in date_formats:
-            try:
-                return datetime.strptime(date_str, fmt)
-            except ValueError:
-                continue
+        # Try the date formats whose pattern matches
+        for pattern, fmt in DATE_FORMATS:
+            if pattern.fullmatch(date_str):
+                try:
+                    return datetime.strptime(date_str, fmt)
+                except ValueError:
+                    continue
     
     return None
 
-def extract_camera_lens_info(text):
-    """Extract camera and lens information from file description."""
+def extract_camera_lens_info(fields):
+    """Extract camera and lens information from the scanned fields."""
     camera = None
     lens = None
     
-    # Look for camera information
-    camera_patterns = [
-        r'Camera:\s*([^,\|\}\n]+)',
-        r'camera used[:\s]+([^,\|\}\n]+)',
-        r'taken with[:\s]+([^,\|\}\n]+)',
-        r'shot with[:\s]+([^,\|\}\n]+)'
-    ]
-    
-    for pattern in camera_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            camera = match.group(1).strip()
+    # Look for camera information, in order of pattern preference
+    for i in range(len(CAMERA_PATTERNS)):
+        if f'camera_{i}' in fields:
+            camera = fields[f'camera_{i}'].strip()
             break
     
     # Look for lens information
-    lens_patterns = [
-        r'Lens:\s*([^,\|\}\n]+)',
-        r'lens used[:\s]+([^,\|\}\n]+)',
-        r'([0-9]+[-\s]*[0-9]*\s*mm\s*f\/[0-9\.]+)',  # Pattern like "24-70mm f/2.8"
-        r'([0-9]+\s*mm\s*f\/[0-9\.]+)'               # Pattern like "50mm f/1.4"
-    ]
-    
-    for pattern in lens_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            lens = match.group(1).strip()
+    for i in range(len(LENS_PATTERNS)):
+        if f'lens_{i}' in fields:
+            lens = fields[f'lens_{i}'].strip()
             break
     
     return camera, lens
 
-def extract_categories(text):
-    """Extract all categories from file description."""
-    category_pattern = r'\[\[Category:([^\]]+)\]\]'
-    return re.findall(category_pattern, text)
+def dms_to_decimal(degrees, minutes, seconds, negative):
+    """Convert degrees, minutes and seconds to decimal degrees."""
+    value = float(degrees) + float(minutes) * INV_60 + float(seconds) * INV_3600
+    return -value if negative else value
 
-def extract_location(text):
-    """Extract location information from file description."""
+def extract_location(fields):
+    """Extract location information from the scanned fields."""
     # Look for Location template
-    location_match = re.search(r'{{Location\s*\|([^}]+)}}', text)
-    if location_match:
-        try:
-            params = location_match.group(1).split('|')
-            if len(params) >= 8:
-                lat_deg, lat_min, lat_sec, lat_dir = params[0:4]
-                lon_deg, lon_min, lon_sec, lon_dir = params[4:8]
-                
-                # Calculate decimal coordinates
-                lat = int(lat_deg) + float(lat_min)/60 + float(lat_sec)/3600
-                lon = int(lon_deg) + float(lon_min)/60 + float(lon_sec)/3600
-                
-                if lat_dir.upper() == 'S':
-                    lat = -lat
-                if lon_dir.upper() == 'W':
-                    lon = -lon
-                
+    if 'location' in fields:
+        params = fields['location'].split('|')
+        if len(params) >= 8:
+            lat_deg, lat_min, lat_sec, lat_dir, lon_deg, lon_min, lon_sec, lon_dir = params[:8]
+            
+            # Calculate decimal coordinates
+            try:
+                lat = dms_to_decimal(lat_deg, lat_min, lat_sec, lat_dir.upper() == 'S')
+                lon = dms_to_decimal(lon_deg, lon_min, lon_sec, lon_dir.upper() == 'W')
+            except ValueError:
+                lat = None
+            
+            if lat is not None:
                 return lat, lon
-        except (ValueError, IndexError):
-            pass
     
     # Look for coordinates in other formats
-    coord_match = re.search(r'{{Coord\|([^}]+)}}', text)
-    if coord_match:
-        coords = coord_match.group(1).split('|')
+    if 'coord' in fields:
+        coords = fields['coord'].split('|')
         try:
             if len(coords) >= 2:
                 lat = float(coords[0])
@@ -171,25 +266,70 @@ def extract_location(text):
     
     return None
 
-def extract_resolution_and_size(file_page):
+def fetch_file_metadata(titles):
+    """Fetch page text and file info for many files with batched API requests.
+    
+    Returns a dict mapping each existing title to a dict with the keys
+    'text', 'width', 'height' and 'size'.
+    """
+    metadata = {}
+    titles = list(dict.fromkeys(titles))
+    for start in range(0, len(titles), API_BATCH_SIZE):
+        params = {
+            'action': 'query',
+            'prop': 'imageinfo|revisions',
+            'iiprop': 'size',
+            'rvprop': 'content',
+            'rvslots': 'main',
+            'titles': titles[start:start + API_BATCH_SIZE],
+            'formatversion': 2,
+        }
+        # Large batches of page text may be split over several responses
+        while True:
+            data = site.simple_request(**params).submit()
+            for page in data.get('query', {}).get('pages', []):
+                if page.get('missing'):
+                    continue
+                info = metadata.setdefault(page['title'], {
+                    'text': None, 'width': None, 'height': None, 'size': None
+                })
+                revisions = page.get('revisions')
+                if revisions:
+                    info['text'] = revisions[0]['slots']['main'].get('content', '')
+                imageinfo = page.get('imageinfo')
+                if imageinfo:
+                    info['width'] = imageinfo[0].get('width')
+                    info['height'] = imageinfo[0].get('height')
+                    info['size'] = imageinfo[0].get('size')
+            if 'continue' not in data:
+                break
+            params.update(data['continue'])
+    return metadata
+
+def extract_resolution_and_size(file_info):
     """Get resolution and file size information."""
-    try:
-        file_info = file_page.latest_file_info
-        width = file_info.width
-        height = file_info.height
-        size = file_info.size  # in bytes
-        return width, height, size
-    except:
-        return None, None, None
+    width = file_info.get('width')
+    height = file_info.get('height')
+    size = file_info.get('size')  # in bytes
+    return width, height, size
 
-def get_reverse_geocode(lat, lon):
-    """Get location name from coordinates using Nominatim API."""
+def open_geocode_cache():
+    """Open (and create if needed) the persistent coordinates -> location cache."""
+    cache = sqlite3.connect(GEOCODE_CACHE_FILE, check_same_thread=False)
+    cache.execute("CREATE TABLE IF NOT EXISTS geocode "
+                  "(lat REAL, lon REAL, location TEXT, PRIMARY KEY (lat, lon))")
+    return cache
+
+geocode_cache = open_geocode_cache()
+
+def fetch_reverse_geocode(lat, lon):
+    """Get location name from coordinates using Nominatim API.
+    
+    Returns None if the request fails, so failures are not cached.
+    """
     try:
         url = f"https://nominatim.openstreetmap.org/reverse?format=json&lat={lat}&lon={lon}&zoom=10"
-        headers = {
-            'User-Agent': 'YOUR_USERNAME Wikipedia Bot/1.0'
-        }
-        response = requests.get(url, headers=headers)
+        response = session.get(url, timeout=15)
         data = json.loads(response.text)
         
         # Extract country and state/city
@@ -198,130 +338,247 @@ def get_reverse_geocode(lat, lon):
         state = address.get('state', address.get('county', address.get('city', 'Unknown')))
         
         return f"{state}, {country}"
-    except:
+    except (requests.RequestException, json.JSONDecodeError, AttributeError):
+        return None
+    finally:
+        time.sleep(NOMINATIM_DELAY)
+
+@lru_cache(maxsize=None)
+def lookup_location(lat, lon):
+    """Get location name for rounded coordinates, from the cache if possible."""
+    cached = geocode_cache.execute("SELECT location FROM geocode WHERE lat = ? AND lon = ?",
+                                   (lat, lon)).fetchone()
+    if cached:
+        return cached[0]
+    
+    location = fetch_reverse_geocode(lat, lon)
+    if location is None:
         return "Unknown"
+    geocode_cache.execute("INSERT OR REPLACE INTO geocode (lat, lon, location) VALUES (?, ?, ?)",
+                          (lat, lon, location))
+    geocode_cache.commit()
+    return location
+
+def get_reverse_geocode(lat, lon):
+    """Get location name from coordinates."""
+    # Nearby coordinates share a cache entry
+    return lookup_location(round(lat, GEOCODE_PRECISION), round(lon, GEOCODE_PRECISION))
+
+def reverse_geocode_offline(coordinates):
+    """Get location names for many coordinates at once without network access."""
+    results = reverse_geocoder.search(coordinates, mode=1)
+    return [f"{result['admin1'] or 'Unknown'}, {result['cc']}" for result in results]
 
-def download_and_get_aspect_ratio(file_page):
-    """Download image and calculate aspect ratio."""
+def download_and_get_aspect_ratio(file_page, file_info):
+    """Calculate aspect ratio without downloading the image."""
     try:
         # Get resolution from file info
-        width, height, _ = extract_resolution_and_size(file_page)
+        width, height, _ = extract_resolution_and_size(file_info)
         if width and height:
             return width / height
         
-        # If that fails, download image and check
-        image_url = file_page.get_file_url()
-        response = requests.get(image_url)
-        img = Image.open(BytesIO(response.content))
-        width, height = img.size
-        return width / height
-    except:
+        # If that fails, ask the API for the dimensions only
+        request = site.simple_request(action='query', prop='imageinfo', iiprop='size|url',
+                                      titles=file_page.title(), formatversion=2)
+        data = request.submit()
+        for page in data.get('query', {}).get('pages', []):
+            imageinfo = page.get('imageinfo')
+            if not imageinfo:
+                continue
+            if imageinfo[0].get('height'):
+                return imageinfo[0]['width'] / imageinfo[0]['height']
+            
+            # As a last resort, read only the header of the original
+            from PIL import Image  # Rarely needed, so imported here
+            from io import BytesIO
+            with session.get(imageinfo[0]['url'], stream=True, timeout=30) as response:
+                response.raise_for_status()
+                header = response.raw.read(HEADER_BYTES, decode_content=True)
+            width, height = Image.open(BytesIO(header)).size
+            return width / height
+        return None
+    except (pywikibot.exceptions.Error, KeyError, requests.RequestException, OSError):
         return None
 
-def format_aspect_ratio(ratio):
-    """Format aspect ratio as a string like 16:9, 4:3, etc."""
-    if not ratio:
-        return "Unknown"
-    
-    # Common aspect ratios and their names
-    common_ratios = {
-        1.0: "1:1",
-        1.33: "4:3",
-        1.5: "3:2",
-        1.78: "16:9",
-        1.85: "1.85:1",
-        2.35: "2.35:1",
-        0.67: "2:3",
-        0.75: "3:4",
-        0.56: "9:16"
+def count_aspect_ratios(ratios):
+    """Count aspect ratios by name, like 16:9, 4:3, etc."""
+    counts = Counter()
+    if not len(ratios):
+        return counts
+    
+    # Find closest common ratio on either side of each ratio
+    idx = np.searchsorted(RATIO_KEYS, ratios).clip(1, len(RATIO_KEYS) - 1)
+    idx -= (ratios - RATIO_KEYS[idx - 1]) < (RATIO_KEYS[idx] - ratios)
+    common = np.abs(ratios - RATIO_KEYS[idx]) < RATIO_TOLERANCE
+    
+    for i, count in enumerate(np.bincount(idx[common], minlength=len(RATIO_KEYS))):
+        if count:
+            counts[RATIO_NAMES[i]] = int(count)
+    
+    # If not common, use numerical value
+    for ratio in ratios[~common]:
+        counts[f"{ratio:.2f}:1"] += 1
+    
+    return counts
+
+def process_file(entry, file_info):
+    """Collect the statistics of a single uploaded file.
+    
+    file_info is the file's entry from fetch_file_metadata(). Returns a dict
+    with the extracted values.
+    """
+    page, _, timestamp, _ = entry
+    
+    # Get text content and scan it once for all fields
+    text = file_info['text'] or ''
+    fields, categories = scan_text(text)
+    camera, lens = extract_camera_lens_info(fields)
+    
+    return {
+        'upload_date': timestamp,
+        'categories': categories,
+        'camera': camera,
+        'lens': lens,
+        'aspect_ratio': download_and_get_aspect_ratio(page, file_info),
+        'location': extract_location(fields),
+        'resolution_and_size': extract_resolution_and_size(file_info),
     }
+
+def count_uploads_by_period(upload_dates):
+    """Count uploads per month ('YYYY-MM') and per year, in date order."""
+    dates = np.array(upload_dates, dtype='datetime64[s]')
+    months, month_counts = np.unique(dates.astype('datetime64[M]'), return_counts=True)
+    years, year_counts = np.unique(dates.astype('datetime64[Y]'), return_counts=True)
+    uploads_by_month = dict(zip(months.astype(str).tolist(), month_counts.tolist()))
+    uploads_by_year = dict(zip((years.astype(int) + 1970).tolist(), year_counts.tolist()))
+    return uploads_by_month, uploads_by_year
+
+def iter_batches(iterable, size):
+    """Yield lists of up to size items from iterable."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+def queue_files(contributions, executor, file_queue):
+    """Submit uploaded files for processing while they are being listed.
     
-    # Find closest common ratio
-    for r, name in common_ratios.items():
-        if abs(ratio - r) < 0.05:
-            return name
-    
-    # If not common, return numerical value
-    return f"{ratio:.2f}:1"
+    Runs on its own thread: fetches the metadata of each batch of
+    contributions and puts (page, future) pairs on file_queue, followed
+    by None once all files have been submitted.
+    """
+    try:
+        for batch in iter_batches(contributions, API_BATCH_SIZE):
+            metadata = fetch_file_metadata(page.title() for page, _, _, _ in batch)
+            for entry in batch:
+                page = entry[0]
+                # Only process files that still exist; deleted ones have no metadata
+                if page.namespace() == 6 and page.title() in metadata:
+                    future = executor.submit(process_file, entry, metadata[page.title()])
+                    file_queue.put((page, future))
+    finally:
+        file_queue.put(None)
 
 def generate_statistics():
     """Generate statistics about uploads."""
     print("Generating statistics about your uploads...")
     
-    # Get all files by the user
+    # Files by the user are streamed from the contributions list
     user = pywikibot.User(site, username)
-    files = list(user.contributions(total=5000, namespace=6))  # Namespace 6 is File
-    
-    if not files:
-        print(f"No files found for user {username}")
-        return
-    
-    print(f"Found {len(files)} files to analyze")
+    contributions = user.contributions(total=MAX_FILES, namespaces=6)  # Namespace 6 is File
+    num_files = 0
     
     # Data structures for statistics
     upload_dates = []
     categories_count = Counter()
     camera_lens_combos = Counter()
-    aspect_ratios = Counter()
+    aspect_ratio_values = np.empty(MAX_FILES)
+    num_aspect_ratios = 0
     locations = defaultdict(int)
-    resolutions = []
-    file_sizes = []
-    
-    # Counts for charts
-    uploads_by_month = defaultdict(int)
-    uploads_by_year = defaultdict(int)
-    
-    # Process each file
-    for i, (timestamp, page, _, _) in enumerate(files):
-        if i % 10 == 0:
-            print(f"Processing file {i+1}/{len(files)}: {page.title()}")
+    resolutions = np.empty((MAX_FILES, 2), dtype=np.int64)  # (width, height)
+    file_sizes = np.empty(MAX_FILES, dtype=np.int64)
+    num_resolutions = 0
+    num_sizes = 0
+    
+    # Files are processed in parallel while the list is still being fetched.
+    # Without the offline geocoder, reverse geocoding runs on its own single
+    # worker so the Nominatim usage policy (1 request/s) is respected
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor, \
+            ThreadPoolExecutor(max_workers=1) as geocoder:
+        file_queue = queue.Queue(maxsize=QUEUE_SIZE)
+        producer = threading.Thread(target=queue_files,
+                                    args=(contributions, executor, file_queue), daemon=True)
+        producer.start()
+        location_futures = []
+        coordinates = []
         
-        try:
-            if not page.exists() or page.namespace() != 6:  # Only process files
-                continue
+        # Aggregate results in this thread in the order files were listed
+        for page, future in iter(file_queue.get, None):
+            num_files += 1
+            if num_files % 10 == 1:
+                print(f"Processing file {num_files}: {page.title()}")
             
-            # 1. Get upload date
-            upload_date = timestamp
-            upload_dates.append(upload_date)
-            uploads_by_month[upload_date.strftime('%Y-%m')] += 1
-            uploads_by_year[upload_date.year] += 1
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"Error processing {page.title()}: {e}")
+                continue
             
-            # 2. Get text content
-            text = page.text
+            # 1. Upload date
+            upload_dates.append(result['upload_date'])
             
-            # 3. Extract categories
-            for category in extract_categories(text):
+            # 2. Categories
+            for category in result['categories']:
                 categories_count[category] += 1
             
-            # 4. Extract camera and lens info
-            camera, lens = extract_camera_lens_info(text)
+            # 3. Camera and lens
+            camera, lens = result['camera'], result['lens']
             if camera and lens:
                 camera_lens_combos[f"{camera} + {lens}"] += 1
             elif camera:
                 camera_lens_combos[camera] += 1
             
-            # 5. Extract aspect ratio
-            aspect_ratio = download_and_get_aspect_ratio(page)
+            # 4. Aspect ratio
+            aspect_ratio = result['aspect_ratio']
             if aspect_ratio:
-                ratio_name = format_aspect_ratio(aspect_ratio)
-                aspect_ratios[ratio_name] += 1
+                aspect_ratio_values[num_aspect_ratios] = aspect_ratio
+                num_aspect_ratios += 1
             
-            # 6. Extract location
-            location_coords = extract_location(text)
-            if location_coords:
-                lat, lon = location_coords
-                location_name = get_reverse_geocode(lat, lon)
-                locations[location_name] += 1
+            # 5. Location (resolved offline after the loop or in the background)
+            if result['location']:
+                lat, lon = result['location']
+                if reverse_geocoder is not None:
+                    coordinates.append((lat, lon))
+                else:
+                    location_futures.append(geocoder.submit(get_reverse_geocode, lat, lon))
             
-            # 7. Extract resolution and file size
-            width, height, size = extract_resolution_and_size(page)
+            # 6. Resolution and file size
+            width, height, size = result['resolution_and_size']
             if width and height:
-                resolutions.append((width, height))
+                resolutions[num_resolutions] = width, height
+                num_resolutions += 1
             if size:
-                file_sizes.append(size)
+                file_sizes[num_sizes] = size
+                num_sizes += 1
         
-        except Exception as e:
-            print(f"Error processing {page.title()}: {e}")
+        for future in location_futures:
+            locations[future.result()] += 1
+        if coordinates:
+            for location in reverse_geocode_offline(coordinates):
+                locations[location] += 1
+    
+    if not num_files:
+        print(f"No files found for user {username}")
+        return
+    
+    print(f"Analyzed {num_files} files")
+    
+    uploads_by_month, uploads_by_year = count_uploads_by_period(upload_dates)
+    aspect_ratios = count_aspect_ratios(aspect_ratio_values[:num_aspect_ratios])
+    resolutions = resolutions[:num_resolutions]
+    file_sizes = file_sizes[:num_sizes]
     
     # Generate plots and report
     generate_plots(uploads_by_month, uploads_by_year, categories_count, 
@@ -332,87 +589,89 @@ def generate_statistics():
                    camera_lens_combos, aspect_ratios, locations, 
                    resolutions, file_sizes)
 
-def generate_plots(uploads_by_month, uploads_by_year, categories_count, 
-                  camera_lens_combos, aspect_ratios, locations, 
-                  resolutions, file_sizes):
-    """Generate plots from the collected statistics."""
-    
-    # 1. Upload trend by month
-    plt.figure(figsize=(12, 6))
+def plot_uploads_by_month(ax, uploads_by_month):
+    """Upload trend by month."""
     months = sorted(uploads_by_month.keys())
     counts = [uploads_by_month[m] for m in months]
-    plt.bar(months, counts)
-    plt.xticks(rotation=90)
-    plt.title(f'Uploads by Month - {username}')
-    plt.xlabel('Month')
-    plt.ylabel('Number of uploads')
-    plt.tight_layout()
-    plt.savefig(os.path.join(OUTPUT_DIR, 'uploads_by_month.png'))
-    plt.close()
-    
-    # 2. Upload trend by year
-    plt.figure(figsize=(10, 6))
+    ax.bar(months, counts)
+    ax.tick_params(axis='x', labelrotation=90)
+    ax.set_title(f'Uploads by Month - {username}')
+    ax.set_xlabel('Month')
+    ax.set_ylabel('Number of uploads')
+
+def plot_uploads_by_year(ax, uploads_by_year):
+    """Upload trend by year."""
     years = sorted(uploads_by_year.keys())
     counts = [uploads_by_year[y] for y in years]
-    plt.bar(years, counts)
-    plt.title(f'Uploads by Year - {username}')
-    plt.xlabel('Year')
-    plt.ylabel('Number of uploads')
-    plt.tight_layout()
-    plt.savefig(os.path.join(OUTPUT_DIR, 'uploads_by_year.png'))
-    plt.close()
-    
-    # 3. Top categories pie chart
-    plt.figure(figsize=(10, 8))
+    ax.bar(years, counts)
+    ax.set_title(f'Uploads by Year - {username}')
+    ax.set_xlabel('Year')
+    ax.set_ylabel('Number of uploads')
+
+def plot_top_categories(ax, categories_count):
+    """Top categories pie chart."""
     top_categories = dict(categories_count.most_common(10))
-    plt.pie(top_categories.values(), labels=top_categories.keys(), autopct='%1.1f%%')
-    plt.title(f'Top 10 Categories - {username}')
-    plt.tight_layout()
-    plt.savefig(os.path.join(OUTPUT_DIR, 'top_categories.png'))
-    plt.close()
-    
-    # 4. Camera-lens combinations bar chart
-    plt.figure(figsize=(12, 6))
+    ax.pie(top_categories.values(), labels=top_categories.keys(), autopct='%1.1f%%')
+    ax.set_title(f'Top 10 Categories - {username}')
+
+def plot_camera_lens_combos(ax, camera_lens_combos):
+    """Camera-lens combinations bar chart."""
     top_combos = dict(camera_lens_combos.most_common(10))
-    plt.barh(list(top_combos.keys()), list(top_combos.values()))
-    plt.title(f'Top 10 Camera-Lens Combinations - {username}')
-    plt.xlabel('Number of uploads')
-    plt.tight_layout()
-    plt.savefig(os.path.join(OUTPUT_DIR, 'camera_lens_combos.png'))
-    plt.close()
-    
-    # 5. Aspect ratios pie chart
-    plt.figure(figsize=(10, 8))
-    plt.pie(aspect_ratios.values(), labels=aspect_ratios.keys(), autopct='%1.1f%%')
-    plt.title(f'Aspect Ratios Distribution - {username}')
-    plt.tight_layout()
-    plt.savefig(os.path.join(OUTPUT_DIR, 'aspect_ratios.png'))
-    plt.close()
-    
-    # 6. File sizes histogram
-    if file_sizes:
-        plt.figure(figsize=(10, 6))
-        sizes_mb = [s / (1024 * 1024) for s in file_sizes]  # Convert to MB
-        plt.hist(sizes_mb, bins=20)
-        plt.title(f'File Size Distribution - {username}')
-        plt.xlabel('Size (MB)')
-        plt.ylabel('Number of files')
-        plt.tight_layout()
-        plt.savefig(os.path.join(OUTPUT_DIR, 'file_sizes.png'))
-        plt.close()
-    
-    # 7. Resolutions scatter plot
-    if resolutions:
-        plt.figure(figsize=(10, 6))
-        widths = [r[0] for r in resolutions]
-        heights = [r[1] for r in resolutions]
-        plt.scatter(widths, heights, alpha=0.5)
-        plt.title(f'Image Resolutions - {username}')
-        plt.xlabel('Width (pixels)')
-        plt.ylabel('Height (pixels)')
-        plt.tight_layout()
-        plt.savefig(os.path.join(OUTPUT_DIR, 'resolutions.png'))
-        plt.close()
+    ax.barh(list(top_combos.keys()), list(top_combos.values()))
+    ax.set_title(f'Top 10 Camera-Lens Combinations - {username}')
+    ax.set_xlabel('Number of uploads')
+
+def plot_aspect_ratios(ax, aspect_ratios):
+    """Aspect ratios pie chart."""
+    ax.pie(aspect_ratios.values(), labels=aspect_ratios.keys(), autopct='%1.1f%%')
+    ax.set_title(f'Aspect Ratios Distribution - {username}')
+
+def plot_file_sizes(ax, file_sizes):
+    """File sizes histogram."""
+    sizes_mb = file_sizes / (1024 * 1024)  # Convert to MB
+    ax.hist(sizes_mb, bins=20)
+    ax.set_title(f'File Size Distribution - {username}')
+    ax.set_xlabel('Size (MB)')
+    ax.set_ylabel('Number of files')
+
+def plot_resolutions(ax, resolutions):
+    """Resolutions scatter plot."""
+    ax.scatter(resolutions[:, 0], resolutions[:, 1], alpha=0.5)
+    ax.set_title(f'Image Resolutions - {username}')
+    ax.set_xlabel('Width (pixels)')
+    ax.set_ylabel('Height (pixels)')
+
+def render_plot(spec):
+    """Render one plot to a PNG file in OUTPUT_DIR."""
+    # A bare Figure renders with Agg, without pyplot or a GUI backend
+    from matplotlib.figure import Figure  # Slow to import, only needed here
+    
+    filename, figsize, plot, data = spec
+    fig = Figure(figsize=figsize)
+    plot(fig.add_subplot(), data)
+    fig.tight_layout()
+    fig.savefig(os.path.join(OUTPUT_DIR, filename))
+
+def generate_plots(uploads_by_month, uploads_by_year, categories_count, 
+                  camera_lens_combos, aspect_ratios, locations, 
+                  resolutions, file_sizes):
+    """Generate plots from the collected statistics."""
+    specs = [
+        ('uploads_by_month.png', (12, 6), plot_uploads_by_month, uploads_by_month),
+        ('uploads_by_year.png', (10, 6), plot_uploads_by_year, uploads_by_year),
+        ('top_categories.png', (10, 8), plot_top_categories, categories_count),
+        ('camera_lens_combos.png', (12, 6), plot_camera_lens_combos, camera_lens_combos),
+        ('aspect_ratios.png', (10, 8), plot_aspect_ratios, aspect_ratios),
+    ]
+    if len(file_sizes):
+        specs.append(('file_sizes.png', (10, 6), plot_file_sizes, file_sizes))
+    if len(resolutions):
+        specs.append(('resolutions.png', (10, 6), plot_resolutions, resolutions))
+    
+    # Rendered in this process: worker processes would re-run the module-level
+    # site and cache setup on import
+    for spec in specs:
+        render_plot(spec)
 
 def generate_report(uploads_by_month, uploads_by_year, categories_count, 
                    camera_lens_combos, aspect_ratios, locations, 
@@ -423,22 +682,26 @@ def generate_report(uploads_by_month, uploads_by_year, categories_count,
     total_uploads = sum(uploads_by_month.values())
     
     # For file sizes
-    if file_sizes:
-        avg_size_mb = sum(file_sizes) / len(file_sizes) / (1024 * 1024)  # Average size in MB
-        max_size_mb = max(file_sizes) / (1024 * 1024)  # Max size in MB
+    if len(file_sizes):
+        avg_size_mb = file_sizes.mean() / (1024 * 1024)  # Average size in MB
+        max_size_mb = file_sizes.max() / (1024 * 1024)  # Max size in MB
     else:
         avg_size_mb = 0
         max_size_mb = 0
+    large_files = int((file_sizes > 5 * 1024 * 1024).sum())
+    small_files = int((file_sizes < 1024 * 1024).sum())
     
     # For resolutions
-    if resolutions:
-        avg_width = sum(r[0] for r in resolutions) / len(resolutions)
-        avg_height = sum(r[1] for r in resolutions) / len(resolutions)
-        max_res = max(resolutions, key=lambda r: r[0] * r[1])
+    if len(resolutions):
+        avg_width, avg_height = resolutions.mean(axis=0)
+        max_res = resolutions[(resolutions[:, 0] * resolutions[:, 1]).argmax()]
     else:
         avg_width = 0
         avg_height = 0
         max_res = (0, 0)
+    widths, heights = resolutions[:, 0], resolutions[:, 1]
+    uhd_files = int(((widths >= 3840) | (heights >= 2160)).sum())
+    hd_files = int((((widths >= 1920) & (widths < 3840)) | ((heights >= 1080) & (heights < 2160))).sum())
     
     # Generate wiki markup report
     report = f"""= Upload Statistics for {username} =
@@ -467,14 +730,14 @@ def generate_report(uploads_by_month, uploads_by_year, categories_count,
 == File Size Statistics ==
 * Average file size: {avg_size_mb:.2f} MB
 * Maximum file size: {max_size_mb:.2f} MB
-* Files larger than 5 MB: {sum(1 for s in file_sizes if s > 5 * 1024 * 1024)}
-* Files smaller than 1 MB: {sum(1 for s in file_sizes if s < 1024 * 1024)}
+* Files larger than 5 MB: {large_files}
+* Files smaller than 1 MB: {small_files}
 
 == Resolution Statistics ==
 * Average resolution: {avg_width:.0f} × {avg_height:.0f} pixels
 * Maximum resolution: {max_res[0]} × {max_res[1]} pixels
-* Files with 4K+ resolution: {sum(1 for r in resolutions if r[0] >= 3840 or r[1] >= 2160)}
-* Files with HD resolution: {sum(1 for r in resolutions if 1920 <= r[0] < 3840 or 1080 <= r[1] < 2160)}
+* Files with 4K+ resolution: {uhd_files}
+* Files with HD resolution: {hd_files}
 
 Report generated by pwb_statistics.py on ~~~~~
 """
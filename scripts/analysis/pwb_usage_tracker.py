@@ -7,6 +7,8 @@ import re
 import argparse
 import time
 from collections import defaultdict
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
 
 """
 pwb_usage_tracker.py - Track where your files are used across Wikimedia projects
@@ -15,7 +17,8 @@ This script finds which Wikipedia articles, Wikimedia Commons galleries,
 or other wiki pages are using your uploaded files.
 
 Features:
-- Tracks file usage across multiple Wikimedia wikis
+- Tracks file usage across all Wikimedia wikis (globalusage reports every
+  project and language in one query, so no per-wiki lookups are needed)
 - Generates usage reports by project or by file
 - Shows which files are most/least used
 - Identifies orphaned files (not used anywhere)
@@ -30,69 +33,178 @@ Usage:
 # Site configuration
 commons_site = pywikibot.Site('commons', 'commons')
 
-# List of projects to check
-WIKIMEDIA_PROJECTS = [
-    'wikipedia', 'wikisource', 'wikibooks', 'wikinews', 
-    'wikiquote', 'wikiversity', 'wikivoyage', 'wiktionary'
-]
+# Number of files per API request when fetching usage
+API_BATCH_SIZE = 50
 
-# Languages to check (add more as needed)
-LANGUAGES = [
-    'en', 'de', 'fr', 'es', 'it', 'ru', 'ja', 'zh',
-    'pt', 'ar', 'fa', 'pl', 'nl', 'id', 'uk', 'he', 
-    'sv', 'cs', 'ko', 'vi', 'hu', 'no', 'fi', 'da', 
-    'ro', 'ca', 'hi', 'tr', 'sr', 'bg', 'ms', 'el'
-]
+# Number of usage requests in flight at once (parallel reads are fine)
+MAX_WORKERS = 4
 
-def get_file_usage(file_page):
-    """Get information on where a file is used."""
-    usage = defaultdict(list)
-    
-    try:
+# Seconds of replication lag at which the servers ask bots to back off;
+# pywikibot waits and retries when a request is refused for lag
+MAXLAG = 5
+
+def add_usage(usage_by_title, data):
+    """Add the fileusage and globalusage of an API response to usage_by_title."""
+    for page in data.get('query', {}).get('pages', []):
+        usage = usage_by_title.setdefault(page['title'], defaultdict(list))
+        
         # File usage on Commons
-        commons_usage = list(file_page.usingPages())
-        if commons_usage:
-            usage['commons'] = [(page.title(), 'commons') for page in commons_usage]
+        for using_page in page.get('fileusage', []):
+            usage['commons'].append((using_page['title'], 'commons'))
         
         # File usage on other wikis
-        global_usage = file_page.globalusage()
-        for wiki, pages in global_usage.items():
+        for using_page in page.get('globalusage', []):
             # Extract project and language from wiki name
+            wiki = using_page['wiki']
             parts = wiki.split('.')
             if len(parts) >= 2:
                 project = parts[1].replace('wiki', '').replace('pedia', '')
                 lang = parts[0]
-                
-                for page in pages:
-                    usage[wiki].append((page.title, f"{lang}.{project}"))
+                usage[wiki].append((using_page['title'], f"{lang}.{project}"))
+
+def fetch_usage_batch(titles):
+    """Get information on where several files are used, in one API query.
+    
+    Returns a dict mapping each file title to its usage, as returned by
+    get_file_usage().
+    """
+    usage_by_title = {title: defaultdict(list) for title in titles}
+    params = {
+        'action': 'query',
+        'prop': 'fileusage|globalusage',
+        'titles': titles,
+        'fulimit': 'max',
+        'gulimit': 'max',
+        'gufilterlocal': True,
+        'formatversion': 2,
+        'maxlag': MAXLAG,
+    }
+    
+    try:
+        # Long usage lists are split over several responses
+        while True:
+            data = commons_site.simple_request(**params).submit()
+            add_usage(usage_by_title, data)
+            if 'continue' not in data:
+                break
+            params.update(data['continue'])
+    
+    except pywikibot.exceptions.Error as e:
+        print(f"Error getting usage for {len(titles)} files: {e}")
+    
+    return usage_by_title
+
+def fetch_category_usage(category_title, limit=None):
+    """Get usage of the files in a category with one compound API query.
+    
+    Category members and their usage come from the same requests
+    (generator=categorymembers), so the files aren't listed separately.
+    Returns a dict mapping each file title to its usage, as returned by
+    get_file_usage().
+    """
+    usage_by_title = {}
+    params = {
+        'action': 'query',
+        'generator': 'categorymembers',
+        'gcmtitle': category_title,
+        'gcmnamespace': 6,  # Namespace 6 = File
+        'gcmlimit': min(limit, 500) if limit else 'max',
+        'prop': 'fileusage|globalusage',
+        'fulimit': 'max',
+        'gulimit': 'max',
+        'gufilterlocal': True,
+        'formatversion': 2,
+        'maxlag': MAXLAG,
+    }
+    
+    try:
+        while True:
+            data = commons_site.simple_request(**params).submit()
+            add_usage(usage_by_title, data)
+            print(f"Fetched usage of {len(usage_by_title)} files")
+            
+            if 'continue' not in data:
+                break
+            # Only stop once the usage of the files seen so far is complete
+            if limit and data.get('batchcomplete') and len(usage_by_title) >= limit:
+                break
+            params.update(data['continue'])
+    
+    except pywikibot.exceptions.Error as e:
+        print(f"Error getting usage for {category_title}: {e}")
+    
+    if limit:
+        usage_by_title = dict(islice(usage_by_title.items(), limit))
+    return usage_by_title
+
+def count_usage(usage_data):
+    """Return the orphaned file titles and the total number of usages."""
+    orphaned_files = []
+    total_usage_count = 0
+    for title, usage in usage_data.items():
+        # Count total usage
+        file_usage_count = sum(len(pages) for pages in usage.values())
+        total_usage_count += file_usage_count
         
-        return usage
+        # Track orphaned files
+        if file_usage_count == 0:
+            orphaned_files.append(title)
     
-    except Exception as e:
-        print(f"Error getting usage for {file_page.title()}: {e}")
-        return usage
+    return orphaned_files, total_usage_count
+
+def get_file_usage(file_page):
+    """Get information on where a file is used."""
+    return fetch_usage_batch([file_page.title()])[file_page.title()]
+
+def collect_usage(files):
+    """Get usage of many files, fetching API_BATCH_SIZE files per request.
+    
+    Up to MAX_WORKERS requests run concurrently. Returns the usage per
+    file title, the orphaned file titles and the total number of usages.
+    """
+    usage_data = {}
+    
+    batches = [
+        [file_page.title() for file_page in files[start:start + API_BATCH_SIZE]]
+        for start in range(0, len(files), API_BATCH_SIZE)
+    ]
+    
+    # Get usage data; requests back off on server lag instead of sleeping
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        results = executor.map(fetch_usage_batch, batches)
+        
+        done = 0
+        for titles, batch_usage in zip(batches, results):
+            done += len(titles)
+            print(f"Processed {done}/{len(files)} files")
+            
+            for title in titles:
+                usage_data[title] = batch_usage[title]
+    
+    orphaned_files, total_usage_count = count_usage(usage_data)
+    return usage_data, orphaned_files, total_usage_count
 
 def format_usage_report(file_title, usage):
     """Format usage information as readable text."""
     total_usage = sum(len(pages) for pages in usage.values())
     
-    report = f"=== Usage of {file_title} ===\n"
-    report += f"Total usage: {total_usage} pages\n\n"
+    parts = [f"=== Usage of {file_title} ===\n",
+             f"Total usage: {total_usage} pages\n\n"]
     
     if not total_usage:
-        report += "This file is not used on any wiki pages (orphaned).\n"
-        return report
+        parts.append("This file is not used on any wiki pages (orphaned).\n")
+        return "".join(parts)
     
     # Sort wikis by usage count (most used first)
     wikis_sorted = sorted(usage.items(), key=lambda x: len(x[1]), reverse=True)
     
     for wiki, pages in wikis_sorted:
-        report += f"== {wiki} ({len(pages)} pages) ==\n"
+        parts.append(f"== {wiki} ({len(pages)} pages) ==\n")
         for title, _ in pages:
-            report += f"* [[:{title}]]\n"
-        report += "\n"
+            parts.append(f"* [[:{title}]]\n")
+        parts.append("\n")
     
-    return report
+    return "".join(parts)
 
 def process_file(file_title):
     """Process a single file by title."""
@@ -129,42 +241,15 @@ def process_category(category_name, limit=None):
         print(f"Error: Category {category_name} does not exist")
         return None
     
-    # Get files in category
-    files = list(cat.articles(namespaces=6))  # Namespace 6 = File
+    # Get files in category together with their usage
+    usage_data = fetch_category_usage(cat.title(), limit)
     
-    if not files:
+    if not usage_data:
         print(f"No files found in {category_name}")
         return None
     
-    print(f"Found {len(files)} files in {category_name}")
-    
-    if limit and limit < len(files):
-        print(f"Processing only the first {limit} files")
-        files = files[:limit]
-    
-    # Process each file
-    usage_data = {}
-    orphaned_files = []
-    total_usage_count = 0
-    
-    for i, file_page in enumerate(files):
-        print(f"Processing file {i+1}/{len(files)}: {file_page.title()}")
-        
-        # Get usage data
-        usage = get_file_usage(file_page)
-        usage_data[file_page.title()] = usage
-        
-        # Count total usage
-        file_usage_count = sum(len(pages) for pages in usage.values())
-        total_usage_count += file_usage_count
-        
-        # Track orphaned files
-        if file_usage_count == 0:
-            orphaned_files.append(file_page.title())
-        
-        # Don't overload the server
-        if i < len(files) - 1:
-            time.sleep(1)
+    print(f"Found {len(usage_data)} files in {category_name}")
+    orphaned_files, total_usage_count = count_usage(usage_data)
     
     # Create summary report
     summary_report = create_category_summary(usage_data, orphaned_files, total_usage_count)
@@ -177,48 +262,30 @@ def process_user_uploads(username, limit=None):
     # Get user
     user = pywikibot.User(commons_site, username)
     
-    # Get user's uploads
-    uploads = list(user.contributions(namespaces=6, total=5000))  # Namespace 6 = File
+    # Get user's uploads from the upload log (re-uploads appear more than once);
+    # the log also lists files deleted since, which aren't used anywhere
+    files = []
+    seen = set()
+    for page, _, _, exists in user.uploadedImages(total=5000):
+        if not exists:
+            continue
+        title = page.title()
+        if title not in seen:
+            seen.add(title)
+            files.append(page)
     
-    if not uploads:
+    if not files:
         print(f"No uploads found for user {username}")
         return None
     
-    # Extract file pages
-    files = []
-    for _, page, _, _ in uploads:
-        if page.namespace() == 6 and page not in files:
-            files.append(page)
-    
     print(f"Found {len(files)} uploads by {username}")
     
     if limit and limit < len(files):
         print(f"Processing only the first {limit} files")
         files = files[:limit]
     
-    # Process each file
-    usage_data = {}
-    orphaned_files = []
-    total_usage_count = 0
-    
-    for i, file_page in enumerate(files):
-        print(f"Processing file {i+1}/{len(files)}: {file_page.title()}")
-        
-        # Get usage data
-        usage = get_file_usage(file_page)
-        usage_data[file_page.title()] = usage
-        
-        # Count total usage
-        file_usage_count = sum(len(pages) for pages in usage.values())
-        total_usage_count += file_usage_count
-        
-        # Track orphaned files
-        if file_usage_count == 0:
-            orphaned_files.append(file_page.title())
-        
-        # Don't overload the server
-        if i < len(files) - 1:
-            time.sleep(1)
+    # Process the files in batches
+    usage_data, orphaned_files, total_usage_count = collect_usage(files)
     
     # Create summary report
     summary_report = create_user_summary(username, usage_data, orphaned_files, total_usage_count)
@@ -226,7 +293,8 @@ def process_user_uploads(username, limit=None):
     
     return usage_data, summary_report
 
-def create_category_summary(usage_data, orphaned_files, total_usage_count):
+def create_category_summary(usage_data, orphaned_files, total_usage_count,
+                            heading="File Usage Summary"):
     """Create a summary report for a category."""
     # Count files by project
     project_counts = defaultdict(int)
@@ -243,42 +311,44 @@ def create_category_summary(usage_data, orphaned_files, total_usage_count):
     file_usage_counts.sort(key=lambda x: x[1], reverse=True)
     
     # Create report
-    report = "= File Usage Summary =\n\n"
-    report += f"Total files analyzed: {len(usage_data)}\n"
-    report += f"Total file usages: {total_usage_count}\n"
-    report += f"Average usages per file: {total_usage_count / len(usage_data):.2f}\n"
-    report += f"Orphaned files (not used anywhere): {len(orphaned_files)} ({len(orphaned_files) / len(usage_data) * 100:.1f}%)\n\n"
+    num_files = len(usage_data)
+    num_orphaned = len(orphaned_files)
+    parts = [
+        f"= {heading} =\n\n",
+        f"Total files analyzed: {num_files}\n",
+        f"Total file usages: {total_usage_count}\n",
+        f"Average usages per file: {total_usage_count / num_files:.2f}\n",
+        f"Orphaned files (not used anywhere): {num_orphaned} ({num_orphaned / num_files * 100:.1f}%)\n\n",
+    ]
     
     # Most used projects
-    report += "== Usage by Project ==\n"
+    parts.append("== Usage by Project ==\n")
     for project, count in sorted(project_counts.items(), key=lambda x: x[1], reverse=True):
-        report += f"* {project}: {count} usages\n"
+        parts.append(f"* {project}: {count} usages\n")
     
     # Most used files
-    report += "\n== Most Used Files ==\n"
+    parts.append("\n== Most Used Files ==\n")
     for i, (file_title, count) in enumerate(file_usage_counts[:10]):  # Top 10
-        report += f"{i+1}. [[:{file_title}]] - {count} usages\n"
+        parts.append(f"{i+1}. [[:{file_title}]] - {count} usages\n")
     
     # Orphaned files
     if orphaned_files:
-        report += "\n== Orphaned Files ==\n"
+        parts.append("\n== Orphaned Files ==\n")
         for file_title in orphaned_files[:20]:  # Limit to 20 to keep report manageable
-            report += f"* [[:{file_title}]]\n"
+            parts.append(f"* [[:{file_title}]]\n")
         
-        if len(orphaned_files) > 20:
-            report += f"...and {len(orphaned_files) - 20} more\n"
+        if num_orphaned > 20:
+            parts.append(f"...and {num_orphaned - 20} more\n")
     
-    report += f"\nReport generated by pwb_usage_tracker.py on {time.strftime('%Y-%m-%d')}"
+    parts.append(f"\nReport generated by pwb_usage_tracker.py on {time.strftime('%Y-%m-%d')}")
     
-    return report
+    return "".join(parts)
 
 def create_user_summary(username, usage_data, orphaned_files, total_usage_count):
     """Create a summary report for a user's uploads."""
     # Same as category summary but with user-specific title
-    report = create_category_summary(usage_data, orphaned_files, total_usage_count)
-    report = f"= File Usage Summary for {username} =\n\n" + report.split("\n\n", 1)[1]
-    
-    return report
+    return create_category_summary(usage_data, orphaned_files, total_usage_count,
+                                   heading=f"File Usage Summary for {username}")
 
 def save_report(report, title):
     """Save report to a wiki page."""
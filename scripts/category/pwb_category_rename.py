@@ -1,4 +1,5 @@
 import pywikibot
+import re
 
 # Configuration of site and main category
 site = pywikibot.Site('commons', 'commons')
@@ -12,14 +13,20 @@ replacements = {
     # Add more replacements as needed
 }
 
+# All old texts in one pattern, longest first so that a name is not
+# replaced inside a longer one
+replacement_pattern = re.compile('|'.join(
+    re.escape(old_text) for old_text in sorted(replacements, key=len, reverse=True)
+))
+
 # Function that replaces texts in categories
-def replace_text_in_page(page, replacements):
+def replace_text_in_page(page, replacements, pattern):
     text = page.text
     original_text = text  # Save text before changes
 
-    # Iterate through the replacement table and make replacements
-    for old_text, new_text in replacements.items():
-        text = text.replace(old_text, new_text)
+    # Make all replacements in a single pass, if any old text is present
+    if any(old_text in text for old_text in replacements):
+        text = pattern.sub(lambda match: replacements[match.group(0)], text)
 
     # Check if the text has changed, and only then save
     if text != original_text:
@@ -41,7 +48,7 @@ def main():
         # Check each page in the subcategory
         for page in subcategory.articles():
             print(f'Checking page: {page.title()}')
-            replace_text_in_page(page, replacements)
+            replace_text_in_page(page, replacements, replacement_pattern)
 
 if __name__ == "__main__":
     main()
@@ -5,6 +5,7 @@ import pywikibot
 from pywikibot import pagegenerators
 import re
 from collections import Counter, defaultdict
+from itertools import chain, islice
 import argparse
 
 """
@@ -28,75 +29,135 @@ Usage:
 # Site configuration
 site = pywikibot.Site('commons', 'commons')
 
+# Category links, with an optional sort key
+CATEGORY_RE = re.compile(r'\[\[Category:([^\]|]+)(?:\|[^\]]+)?\]\]', re.IGNORECASE)
+
+# Separators between the meaningful parts of a filename
+NAME_SPLIT_RE = re.compile(r'[-_,\s.]')
+
+# Number of titles per API request when fetching categories
+API_BATCH_SIZE = 50
+
+# Whether pages exist, by title, filled in batches by check_exists()
+page_exists = {}
+
 def extract_categories(text):
     """Extract all categories from file description."""
-    category_pattern = r'\[\[Category:([^\]|]+)(?:\|[^\]]+)?\]\]'
-    return [cat.strip() for cat in re.findall(category_pattern, text, re.IGNORECASE)]
+    return [match.group(1).strip() for match in CATEGORY_RE.finditer(text)]
 
-def get_file_categories(file_page):
-    """Get all categories for a file."""
-    if not file_page.exists():
-        return []
-    
-    return extract_categories(file_page.text)
+def check_exists(titles):
+    """Check which pages exist, with one API request per batch of titles.
+    
+    Results are kept in page_exists, so each title is only queried once per
+    run. Returns a dict mapping each given title to True or False.
+    """
+    normalized = {}
+    for title in titles:
+        try:
+            normalized[title] = pywikibot.Page(site, title).title()
+        except pywikibot.exceptions.InvalidTitleError:
+            normalized[title] = None
+    
+    unknown = [title for title in dict.fromkeys(normalized.values())
+               if title and title not in page_exists]
+    for start in range(0, len(unknown), API_BATCH_SIZE):
+        request = site.simple_request(action='query', titles=unknown[start:start + API_BATCH_SIZE],
+                                      formatversion=2)
+        data = request.submit()
+        for page in data.get('query', {}).get('pages', []):
+            page_exists[page['title']] = not page.get('missing') and not page.get('invalid')
+    
+    return {title: page_exists.get(normalized[title], False) for title in titles}
 
-def find_similar_files(file_page, max_files=50):
-    """Find similar files based on filename patterns."""
-    similar_files = []
+def fetch_categories_bulk(titles):
+    """Get the visible categories of many pages with batched API requests.
+    
+    Returns a dict mapping each title to its category names, without the
+    Category: prefix.
+    """
+    categories = {title: [] for title in titles}
+    for start in range(0, len(titles), API_BATCH_SIZE):
+        params = {
+            'action': 'query',
+            'prop': 'categories',
+            'titles': titles[start:start + API_BATCH_SIZE],
+            'cllimit': 'max',
+            'clshow': '!hidden',
+            'formatversion': 2,
+        }
+        # Long category lists are split over several responses
+        while True:
+            data = site.simple_request(**params).submit()
+            for page in data.get('query', {}).get('pages', []):
+                page_categories = categories.setdefault(page['title'], [])
+                for category in page.get('categories', []):
+                    page_categories.append(category['title'].split(':', 1)[1])
+            if 'continue' not in data:
+                break
+            params.update(data['continue'])
+    return categories
+
+def iter_similar_files(file_page, max_files=50):
+    """Yield similar files based on filename patterns, then on categories.
+    
+    Searches are lazy, so nothing more is fetched once the caller stops.
+    """
+    seen = {file_page.title()}  # Titles already found, and the file itself
     
     # Get the base file name without File: prefix
     file_name = file_page.title(with_ns=False)
     
-    # Extract meaningful parts of the filename (e.g., location, subject)
-    name_parts = re.split(r'[-_,\s.]', file_name)
-    name_parts = [part for part in name_parts if len(part) > 3]  # Filter out short parts
-    
-    # Get existing categories for the file
-    file_categories = get_file_categories(file_page)
-    
-    # Find similar files based on filename patterns
-    for part in name_parts:
-        if len(part) < 4:
-            continue
-            
-        # Search for files with similar name parts
-        search_term = f"insource:/{part}/i"
-        search_gen = pagegenerators.SearchPageGenerator(search_term, namespaces=[6], total=20)
+    # Extract meaningful parts of the filename (e.g., location, subject),
+    # case-insensitively unique as the search ignores case
+    name_parts = list(dict.fromkeys(
+        part.lower() for part in NAME_SPLIT_RE.split(file_name)
+        if len(part) > 3  # Filter out short parts
+    ))
+    
+    # Find similar files based on filename patterns, with one regex search
+    # for any of the name parts (each insource regex search is expensive)
+    if name_parts:
+        alternatives = '|'.join(re.escape(part).replace('/', '\\/') for part in name_parts)
+        search_term = f"insource:/({alternatives})/i"
+        search_gen = pagegenerators.SearchPageGenerator(search_term, namespaces=[6],
+                                                        total=max_files // 2 + 1)
         
+        # At most half of the similar files come from the filename search
+        found = 0
         for similar_page in search_gen:
-            if similar_page.title() != file_page.title() and similar_page not in similar_files:
-                similar_files.append(similar_page)
-                
-                # Limit the number of similar files
-                if len(similar_files) >= max_files // 2:
+            if similar_page.title() not in seen:
+                seen.add(similar_page.title())
+                yield similar_page
+                found += 1
+                if found >= max_files // 2:
                     break
     
-    # Also find files in the same categories (if not enough found by filename)
-    if file_categories and len(similar_files) < max_files:
-        for category_name in file_categories:
-            try:
-                category = pywikibot.Category(site, f"Category:{category_name}")
-                if not category.exists():
-                    continue
-                    
-                # Get files in this category
-                category_files = list(category.articles(namespaces=[6]))
-                
-                # Add unique files
-                for cat_file in category_files:
-                    if cat_file.title() != file_page.title() and cat_file not in similar_files:
-                        similar_files.append(cat_file)
-                        
-                        # Break if we have enough files
-                        if len(similar_files) >= max_files:
-                            break
-                
-                if len(similar_files) >= max_files:
-                    break
-            except Exception as e:
-                print(f"Error processing category {category_name}: {e}")
+    # Also find files in the same categories, read the same way as the
+    # categories of the similar files (visible ones, from the API)
+    file_categories = fetch_categories_bulk([file_page.title()])[file_page.title()]
+    if not file_categories:
+        return
+    
+    # Look up which of the categories exist, all at once
+    category_exists = check_exists([f"Category:{name}" for name in file_categories])
     
-    return similar_files
+    for category_name in file_categories:
+        try:
+            if not category_exists[f"Category:{category_name}"]:
+                continue
+            category = pywikibot.Category(site, f"Category:{category_name}")
+            
+            # Add unique files in this category
+            for cat_file in category.articles(namespaces=[6]):
+                if cat_file.title() not in seen:
+                    seen.add(cat_file.title())
+                    yield cat_file
+        except Exception as e:
+            print(f"Error processing category {category_name}: {e}")
+
+def find_similar_files(file_page, max_files=50):
+    """Find up to max_files similar files."""
+    return list(islice(iter_similar_files(file_page, max_files), max_files))
 
 def suggest_categories(file_page, similar_files=None, min_occurrence=2):
     """Suggest categories based on similar files."""
@@ -107,29 +168,37 @@ def suggest_categories(file_page, similar_files=None, min_occurrence=2):
         print(f"No similar files found for {file_page.title()}")
         return []
     
-    # Get current categories of the file
-    current_categories = set(get_file_categories(file_page))
+    # Get categories of the file and the similar files in as few requests as possible
+    similar_titles = [similar_file.title() for similar_file in similar_files]
+    file_categories = fetch_categories_bulk([file_page.title()] + similar_titles)
     
-    # Collect categories from similar files
-    all_categories = []
-    for similar_file in similar_files:
-        similar_cats = get_file_categories(similar_file)
-        all_categories.extend(similar_cats)
+    # Get current categories of the file
+    current_categories = set(file_categories[file_page.title()])
     
-    # Count occurrences of each category
-    category_counts = Counter(all_categories)
+    # Count occurrences of each category across the similar files
+    category_counts = Counter(chain.from_iterable(file_categories[title]
+                                                  for title in similar_titles))
     
     # Filter out categories that are already on the file
-    # or don't appear with minimum frequency
-    suggested_categories = []
-    for category, count in category_counts.items():
-        if category not in current_categories and count >= min_occurrence:
-            suggested_categories.append((category, count))
-    
-    # Sort by frequency (most common first)
-    suggested_categories.sort(key=lambda x: x[1], reverse=True)
+    # or don't appear with minimum frequency, most common first
+    return [(category, count) for category, count in category_counts.most_common()
+            if category not in current_categories and count >= min_occurrence]
+
+def add_categories_to_file(file_page, categories_to_add):
+    """Add the categories the file doesn't have yet, in a single edit."""
+    text = file_page.text
+    existing = set(extract_categories(text))
+    new_categories = [category for category in dict.fromkeys(categories_to_add)
+                      if category not in existing]
+    
+    if not new_categories:
+        return False
     
-    return suggested_categories
+    # Save changes
+    file_page.text = text + "".join(f"\n[[Category:{category}]]" for category in new_categories)
+    file_page.save(summary="pwb: Added suggested categories")
+    print(f"Added {len(new_categories)} categories to {file_page.title()}")
+    return True
 
 def process_file(file_title, add_categories=False):
     """Process a single file by title."""
@@ -177,20 +246,7 @@ def process_file(file_title, add_categories=False):
                 return False
         
         if categories_to_add:
-            # Add selected categories to the file
-            text = file_page.text
-            new_text = text
-            for category in categories_to_add:
-                category_tag = f"[[Category:{category}]]"
-                if category_tag not in new_text:
-                    new_text += f"\n{category_tag}"
-            
-            # Save changes
-            if new_text != text:
-                file_page.text = new_text
-                file_page.save(summary="pwb: Added suggested categories")
-                print(f"Added {len(categories_to_add)} categories to {file_title}")
-                return True
+            return add_categories_to_file(file_page, categories_to_add)
     
     return False
 
@@ -207,18 +263,18 @@ def process_category(category_name, add_categories=False, min_occurrence=2):
         print(f"Error: Category {category_name} does not exist")
         return 0
     
-    # Get files in category
-    files = list(cat.articles(namespaces=6))  # Namespace 6 = File
-    
-    if not files:
+    # The file count comes from the category info, so the files can be
+    # processed while later pages of the list are still being fetched
+    num_files = cat.categoryinfo.get('files', 0)
+    if not num_files:
         print(f"No files found in {category_name}")
         return 0
     
-    print(f"Found {len(files)} files in {category_name}")
+    print(f"Found {num_files} files in {category_name}")
     
     updated = 0
-    for i, file_page in enumerate(files):
-        print(f"\nProcessing file {i+1}/{len(files)}: {file_page.title()}")
+    for i, file_page in enumerate(cat.articles(namespaces=6)):  # Namespace 6 = File
+        print(f"\nProcessing file {i+1}/{num_files}: {file_page.title()}")
         
         # Find similar files
         similar_files = find_similar_files(file_page)
@@ -260,21 +316,8 @@ def process_category(category_name, add_categories=False, min_occurrence=2):
                     print("Invalid input, skipping this file")
                     continue
             
-            if categories_to_add:
-                # Add selected categories to the file
-                text = file_page.text
-                new_text = text
-                for category in categories_to_add:
-                    category_tag = f"[[Category:{category}]]"
-                    if category_tag not in new_text:
-                        new_text += f"\n{category_tag}"
-                
-                # Save changes
-                if new_text != text:
-                    file_page.text = new_text
-                    file_page.save(summary="pwb: Added suggested categories")
-                    print(f"Added {len(categories_to_add)} categories to {file_page.title()}")
-                    updated += 1
+            if categories_to_add and add_categories_to_file(file_page, categories_to_add):
+                updated += 1
     
     return updated
 
@@ -5,7 +5,9 @@ import pywikibot
 from pywikibot import pagegenerators
 import re
 import argparse
-from collections import defaultdict
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
 """
 pwb_repair_categories.py - Find and repair category issues
@@ -33,10 +35,49 @@ Usage:
 # Site configuration
 site = pywikibot.Site('commons', 'commons')
 
+# Category links, with an optional sort key
+CATEGORY_RE = re.compile(r'\[\[Category:([^\]|]+)(?:\|[^\]]+)?\]\]', re.IGNORECASE)
+
+# Parts of the names of maintenance and user categories; they are not
+# walked into or repaired
+SKIP_SUBSTRINGS = ('maintenance', '/pwb')
+
+# Number of titles per API request when checking or loading pages
+API_BATCH_SIZE = 50
+
+# Number of category pages kept in memory, so categories that are looked
+# at several times in a run are only fetched and checked once
+CATEGORY_CACHE_SIZE = 4096
+
+# Number of category searches kept in memory; orphans often share name
+# parts like "Photographs" and would otherwise repeat the same search
+SEARCH_CACHE_SIZE = 4096
+
+# Default number of categories analyzed at once (parallel reads are fine)
+MAX_WORKERS = 4
+
 def extract_categories(text):
     """Extract all categories from wiki text."""
-    category_pattern = r'\[\[Category:([^\]|]+)(?:\|[^\]]+)?\]\]'
-    return [cat.strip() for cat in re.findall(category_pattern, text, re.IGNORECASE)]
+    return [cat.strip() for cat in CATEGORY_RE.findall(text)]
+
+def is_skipped_category(title):
+    """Check if a category is a maintenance or user category, which isn't repaired."""
+    title = title.lower()
+    return any(part in title for part in SKIP_SUBSTRINGS)
+
+def find_duplicates(categories):
+    """Get the categories that occur more than once, each listed once."""
+    return [cat for cat, count in Counter(categories).items() if count > 1]
+
+@lru_cache(maxsize=CATEGORY_CACHE_SIZE)
+def get_category(title):
+    """Get the category page for a title, reusing pages already loaded."""
+    return pywikibot.Category(site, title)
+
+@lru_cache(maxsize=CATEGORY_CACHE_SIZE)
+def category_exists(title):
+    """Check whether a category exists, querying each title only once."""
+    return get_category(title).exists()
 
 def get_parent_categories(category_page):
     """Get parent categories of a category."""
@@ -47,6 +88,66 @@ def get_parent_categories(category_page):
         print(f"Error getting parent categories for {category_page.title()}: {e}")
         return []
 
+def batch_exists(titles):
+    """Check which pages exist, with one API request per batch of titles.
+    
+    Returns a dict mapping each given title to True or False.
+    """
+    titles = list(dict.fromkeys(titles))
+    exists = {}
+    for start in range(0, len(titles), API_BATCH_SIZE):
+        chunk = titles[start:start + API_BATCH_SIZE]
+        request = site.simple_request(action='query', titles=chunk, prop='info',
+                                      formatversion=2)
+        data = request.submit().get('query', {})
+        
+        # Map the titles as given to the normalized titles in the response
+        normalized = {title: title for title in chunk}
+        for entry in data.get('normalized', []):
+            normalized[entry['from']] = entry['to']
+        found = {page['title']: 'pageid' in page and not page.get('missing')
+                 for page in data.get('pages', [])}
+        for title in chunk:
+            exists[title] = found.get(normalized[title], False)
+    
+    return exists
+
+def fetch_category_info(titles):
+    """Get the member counts of many categories with batched API requests.
+    
+    Returns a dict mapping each given title to a (pages, subcats, files)
+    tuple; categories without members count as (0, 0, 0).
+    """
+    titles = list(dict.fromkeys(titles))
+    info = {}
+    for start in range(0, len(titles), API_BATCH_SIZE):
+        chunk = titles[start:start + API_BATCH_SIZE]
+        request = site.simple_request(action='query', titles=chunk, prop='categoryinfo',
+                                      formatversion=2)
+        data = request.submit().get('query', {})
+        
+        normalized = {title: title for title in chunk}
+        for entry in data.get('normalized', []):
+            normalized[entry['from']] = entry['to']
+        counts = {}
+        for page in data.get('pages', []):
+            catinfo = page.get('categoryinfo', {})
+            counts[page['title']] = (catinfo.get('pages', 0), catinfo.get('subcats', 0),
+                                     catinfo.get('files', 0))
+        for title in chunk:
+            info[title] = counts.get(normalized[title], (0, 0, 0))
+    
+    return info
+
+def find_empty_categories(titles):
+    """Get the categories among titles that have no pages, subcategories or files."""
+    try:
+        info = fetch_category_info(titles)
+    except Exception as e:
+        print(f"Error checking which categories are empty: {e}")
+        return []
+    return [title for title in titles if not any(info[title])]
+
 def get_subcategories(category_page):
     """Get subcategories of a category."""
     try:
@@ -62,9 +163,9 @@ def analyze_category_hierarchy(category_name, max_depth=3):
         category_name = f'Category:{category_name}'
     
     # Get category
-    category = pywikibot.Category(site, category_name)
+    category = get_category(category_name)
     
-    if not category.exists():
+    if not category_exists(category_name):
         print(f"Error: Category {category_name} does not exist")
         return None
     
@@ -74,41 +175,30 @@ def analyze_category_hierarchy(category_name, max_depth=3):
         'missing_parent_categories': [],
         'broken_hierarchies': [],
         'duplicate_categories': [],
-        'empty_categories': []
+        'empty_categories': [],
+        'file_categories': {}
     }
     
     # Keep track of processed categories to avoid loops
     processed = set()
     
     # Categories to process with their depth
-    to_process = [(category, 0)]
+    to_process = deque([(category, 0)])
+    
+    # Categories in the order they were walked, and the (category, parent)
+    # pairs found on the way
+    walked = []
+    parent_links = []
     
     while to_process:
-        current_category, depth = to_process.pop(0)
+        current_category, depth = to_process.popleft()
         
         if current_category.title() in processed:
             continue
         
         processed.add(current_category.title())
         
-        # Check if category is empty
-        has_articles = False
-        has_subcategories = False
-        
-        try:
-            # Check for articles
-            for _ in current_category.articles(recurse=False):
-                has_articles = True
-                break
-            
-            # Check for subcategories
-            subcategories = list(current_category.subcategories())
-            has_subcategories = len(subcategories) > 0
-            
-            if not has_articles and not has_subcategories:
-                results['empty_categories'].append(current_category.title())
-        except Exception as e:
-            print(f"Error checking if {current_category.title()} is empty: {e}")
+        walked.append(current_category.title())
         
         # Get parent categories
         parent_categories = get_parent_categories(current_category)
@@ -117,23 +207,34 @@ def analyze_category_hierarchy(category_name, max_depth=3):
         if not parent_categories:
             results['orphaned_categories'].append(current_category.title())
         
-        # Check for parent categories that don't exist
+        # Remember parent links; their existence is checked in bulk below
         for parent in parent_categories:
-            parent_page = pywikibot.Category(site, f"Category:{parent}")
-            if not parent_page.exists():
-                results['missing_parent_categories'].append((current_category.title(), parent))
+            parent_links.append((current_category.title(), parent))
         
-        # Add subcategories to process if not at max depth
+        # Add subcategories to process if not at max depth, skipping ones
+        # already walked and maintenance or user subtrees
         if depth < max_depth:
-            subcategories = get_subcategories(current_category)
-            for subcat in subcategories:
-                to_process.append((subcat, depth + 1))
+            for subcat in get_subcategories(current_category):
+                title = subcat.title()
+                if title not in processed and not is_skipped_category(title):
+                    to_process.append((subcat, depth + 1))
+    
+    # Check for empty categories
+    results['empty_categories'] = find_empty_categories(walked)
+    
+    # Check for parent categories that don't exist
+    parent_exists = batch_exists(f"Category:{parent}" for _, parent in parent_links)
+    for category_title, parent in parent_links:
+        if not parent_exists[f"Category:{parent}"]:
+            results['missing_parent_categories'].append((category_title, parent))
     
-    # Check for duplicate categories in files
-    files = list(category.articles(namespaces=6))  # Namespace 6 = File
+    # Check for duplicate categories in files, loading their text in batches
+    files = pagegenerators.PreloadingGenerator(
+        category.articles(namespaces=6), groupsize=API_BATCH_SIZE  # Namespace 6 = File
+    )
     
     # Dictionary to track categories by file
-    file_categories = defaultdict(list)
+    file_categories = results['file_categories']
     
     for file_page in files:
         categories = extract_categories(file_page.text)
@@ -141,19 +242,20 @@ def analyze_category_hierarchy(category_name, max_depth=3):
     
     # Find files with duplicate categories
     for file_title, categories in file_categories.items():
-        seen = set()
-        duplicates = []
-        
-        for cat in categories:
-            if cat in seen:
-                duplicates.append(cat)
-            seen.add(cat)
-        
+        duplicates = find_duplicates(categories)
         if duplicates:
             results['duplicate_categories'].append((file_title, duplicates))
     
     return results
 
+@lru_cache(maxsize=SEARCH_CACHE_SIZE)
+def search_categories(part):
+    """Get the titles of categories found by searching for a name part."""
+    search_results = site.search(
+        f"incategory:Categories {part}", namespaces=[14], total=10  # Namespace 14 = Category
+    )
+    return tuple(result.title() for result in search_results)
+
 def suggest_parent_categories(category_name):
     """Suggest potential parent categories based on name and content."""
     # Ensure category has Category: prefix
@@ -161,9 +263,9 @@ def suggest_parent_categories(category_name):
         category_name = f'Category:{category_name}'
     
     # Get category
-    category = pywikibot.Category(site, category_name)
+    category = get_category(category_name)
     
-    if not category.exists():
+    if not category_exists(category_name):
         print(f"Error: Category {category_name} does not exist")
         return []
     
@@ -178,42 +280,53 @@ def suggest_parent_categories(category_name):
             continue
         
         try:
-            search_results = list(pagegenerators.SearchPageGenerator(
-                f"incategory:Categories {part}", namespaces=[14], total=10  # Namespace 14 = Category
-            ))
-            
-            for result in search_results:
-                if result.title() != category.title():
-                    suggestions.append(result.title())
+            for title in search_categories(part):
+                if title != category.title():
+                    suggestions.append(title)
         except Exception as e:
             print(f"Error searching for similar categories: {e}")
     
-    return suggestions
+    # Orphans sharing name parts are suggested the same results; list each once
+    return list(dict.fromkeys(suggestions))
+
+def report_save_error(page, error):
+    """Report a failed save queued with asynchronous=True."""
+    if error:
+        print(f"Error saving {page.title()}: {error}")
 
 def fix_duplicate_categories(file_title, duplicates):
-    """Remove duplicate categories from a file."""
+    """Remove duplicate categories from a file.
+    
+    The edit is queued and saved in the background while the next file is
+    prepared; save errors are reported by report_save_error.
+    """
     try:
         file_page = pywikibot.Page(site, file_title)
         if not file_page.exists():
             return False
         
         text = file_page.text
-        new_text = text
         
-        # Remove duplicate category tags
-        for duplicate in duplicates:
-            # Find all occurrences of this category
-            pattern = re.compile(r'\[\[Category:' + re.escape(duplicate) + r'(?:\|[^\]]+)?\]\]')
-            matches = list(pattern.finditer(new_text))
-            
-            # Keep the first occurrence, remove the rest
-            if len(matches) > 1:
-                for match in reversed(matches[1:]):  # Process in reverse to avoid position issues
-                    new_text = new_text[:match.start()] + new_text[match.end():]
+        # Keep the first occurrence of each duplicated category, remove the rest
+        duplicates = set(duplicates)
+        seen = set()
+        parts = []
+        last = 0
+        for match in CATEGORY_RE.finditer(text):
+            name = match.group(1).strip()
+            if name not in duplicates:
+                continue
+            if name in seen:
+                parts.append(text[last:match.start()])
+                last = match.end()
+            seen.add(name)
+        parts.append(text[last:])
+        new_text = "".join(parts)
         
         if new_text != text:
             file_page.text = new_text
-            file_page.save(summary="pwb: Removed duplicate categories")
+            file_page.save(summary="pwb: Removed duplicate categories",
+                           asynchronous=True, callback=report_save_error)
             return True
     
     except Exception as e:
@@ -222,10 +335,13 @@ def fix_duplicate_categories(file_title, duplicates):
     return False
 
 def fix_orphaned_category(category_title, suggested_parents):
-    """Add parent categories to an orphaned category."""
+    """Add parent categories to an orphaned category.
+    
+    Like fix_duplicate_categories, the edit is saved in the background.
+    """
     try:
-        category_page = pywikibot.Category(site, category_title)
-        if not category_page.exists():
+        category_page = get_category(category_title)
+        if not category_exists(category_title):
             return False
         
         # Get text
@@ -254,19 +370,21 @@ def fix_orphaned_category(category_title, suggested_parents):
             print("Invalid input")
             return False
         
-        # Add selected parent categories
+        # Add selected parent categories the page isn't in yet
+        existing = {cat.lower() for cat in extract_categories(text)}
         for parent in selected_parents:
             # Remove Category: prefix if present
             if parent.startswith('Category:'):
                 parent = parent[len('Category:'):]
                 
-            category_tag = f"[[Category:{parent}]]"
-            if category_tag not in text:
-                text += f"\n{category_tag}"
+            if parent.lower() not in existing:
+                text += f"\n[[Category:{parent}]]"
+                existing.add(parent.lower())
         
         # Save changes
         category_page.text = text
-        category_page.save(summary="pwb: Added parent categories to orphaned category")
+        category_page.save(summary="pwb: Added parent categories to orphaned category",
+                           asynchronous=True, callback=report_save_error)
         return True
     
     except Exception as e:
@@ -275,7 +393,10 @@ def fix_orphaned_category(category_title, suggested_parents):
     return False
 
 def process_category(category_name, fix_issues=False):
-    """Process a category, find and optionally fix issues."""
+    """Process a category, find and optionally fix issues.
+    
+    Returns the analysis results, or None if the category doesn't exist.
+    """
     print(f"Analyzing category: {category_name}")
     
     # Analyze category hierarchy
@@ -312,7 +433,7 @@ def process_category(category_name, fix_issues=False):
             
             for category_title in results['orphaned_categories']:
                 # Skip maintenance categories or user categories
-                if 'maintenance' in category_title.lower() or '/pwb' in category_title:
+                if is_skipped_category(category_title):
                     continue
                 
                 # Get suggested parent categories
@@ -325,40 +446,42 @@ def process_category(category_name, fix_issues=False):
             print(f"Fixed {orphan_fixed} orphaned categories")
     
     # Create detailed report
-    report = "= Category Structure Analysis Report =\n\n"
-    report += f"Analysis of category: {category_name}\n\n"
+    parts = ["= Category Structure Analysis Report =\n\n",
+             f"Analysis of category: {category_name}\n\n"]
     
     # Orphaned categories
-    report += "== Orphaned Categories ==\n"
+    parts.append("== Orphaned Categories ==\n")
     if results['orphaned_categories']:
         for category in results['orphaned_categories']:
-            report += f"* [[:{category}]]\n"
+            parts.append(f"* [[:{category}]]\n")
     else:
-        report += "No orphaned categories found.\n"
+        parts.append("No orphaned categories found.\n")
     
     # Missing parent categories
-    report += "\n== Missing Parent Categories ==\n"
+    parts.append("\n== Missing Parent Categories ==\n")
     if results['missing_parent_categories']:
         for category, missing_parent in results['missing_parent_categories']:
-            report += f"* [[:{category}]] links to non-existent category: {missing_parent}\n"
+            parts.append(f"* [[:{category}]] links to non-existent category: {missing_parent}\n")
     else:
-        report += "No missing parent categories found.\n"
+        parts.append("No missing parent categories found.\n")
     
     # Empty categories
-    report += "\n== Empty Categories ==\n"
+    parts.append("\n== Empty Categories ==\n")
     if results['empty_categories']:
         for category in results['empty_categories']:
-            report += f"* [[:{category}]] has no articles or subcategories\n"
+            parts.append(f"* [[:{category}]] has no articles or subcategories\n")
     else:
-        report += "No empty categories found.\n"
+        parts.append("No empty categories found.\n")
     
     # Duplicate categories
-    report += "\n== Files with Duplicate Categories ==\n"
+    parts.append("\n== Files with Duplicate Categories ==\n")
     if results['duplicate_categories']:
         for file_title, duplicates in results['duplicate_categories']:
-            report += f"* [[:{file_title}]] has duplicate categories: {', '.join(duplicates)}\n"
+            parts.append(f"* [[:{file_title}]] has duplicate categories: {', '.join(duplicates)}\n")
     else:
-        report += "No files with duplicate categories found.\n"
+        parts.append("No files with duplicate categories found.\n")
+    
+    report = "".join(parts)
     
     print("\nAnalysis complete! Detailed report:")
     print(report)
@@ -376,28 +499,35 @@ def process_category(category_name, fix_issues=False):
             print(f"Report saved to {page_title}")
         except Exception as e:
             print(f"Error saving report: {e}")
+    
+    return results
 
-def process_files_in_category(category_name, fix_issues=False):
-    """Process all files in a category, checking for category issues."""
+def process_files_in_category(category_name, fix_issues=False, precomputed=None):
+    """Process all files in a category, checking for category issues.
+    
+    precomputed optionally maps file titles to their categories, as found by
+    an earlier analysis of the same category; the file text is then not
+    fetched again.
+    """
     # Ensure category has Category: prefix
     if not category_name.startswith('Category:'):
         category_name = f'Category:{category_name}'
     
     # Get category
-    category = pywikibot.Category(site, category_name)
+    category = get_category(category_name)
     
-    if not category.exists():
+    if not category_exists(category_name):
         print(f"Error: Category {category_name} does not exist")
         return
     
-    # Get files in category
-    files = list(category.articles(namespaces=6))  # Namespace 6 = File
-    
-    if not files:
+    # The file count comes from the category info, so the files can be
+    # processed while later pages of the list are still being fetched
+    num_files = category.categoryinfo.get('files', 0)
+    if not num_files:
         print(f"No files found in {category_name}")
         return
     
-    print(f"Found {len(files)} files in {category_name}")
+    print(f"Found {num_files} files in {category_name}")
     
     # Track issues
     issues = {
@@ -405,25 +535,25 @@ def process_files_in_category(category_name, fix_issues=False):
         'missing_categories': []
     }
     
-    # Process each file
-    for i, file_page in enumerate(files):
+    # Process each file, loading page text in batches unless the categories
+    # are already known
+    if precomputed is not None:
+        file_categories = precomputed.items()
+    else:
+        files = pagegenerators.PreloadingGenerator(
+            category.articles(namespaces=6), groupsize=API_BATCH_SIZE  # Namespace 6 = File
+        )
+        file_categories = ((file_page.title(), extract_categories(file_page.text))
+                           for file_page in files)
+    
+    for i, (file_title, categories) in enumerate(file_categories):
         if i % 10 == 0:
-            print(f"Processing file {i+1}/{len(files)}: {file_page.title()}")
-        
-        # Extract categories
-        categories = extract_categories(file_page.text)
+            print(f"Processing file {i+1}/{num_files}: {file_title}")
         
         # Check for duplicate categories
-        seen = set()
-        duplicates = []
-        
-        for cat in categories:
-            if cat in seen:
-                duplicates.append(cat)
-            seen.add(cat)
-        
+        duplicates = find_duplicates(categories)
         if duplicates:
-            issues['duplicate_categories'].append((file_page.title(), duplicates))
+            issues['duplicate_categories'].append((file_title, duplicates))
     
     # Display results
     print("\n=== Category Issues in Files ===\n")
@@ -443,15 +573,17 @@ def process_files_in_category(category_name, fix_issues=False):
         print(f"Fixed {fixed_count} files with duplicate categories")
     
     # Create report
-    report = f"= Category Issues in {category_name} =\n\n"
+    parts = [f"= Category Issues in {category_name} =\n\n"]
     
     # Duplicate categories
-    report += "== Files with Duplicate Categories ==\n"
+    parts.append("== Files with Duplicate Categories ==\n")
     if issues['duplicate_categories']:
         for file_title, duplicates in issues['duplicate_categories']:
-            report += f"* [[:{file_title}]] has duplicate categories: {', '.join(duplicates)}\n"
+            parts.append(f"* [[:{file_title}]] has duplicate categories: {', '.join(duplicates)}\n")
     else:
-        report += "No files with duplicate categories found.\n"
+        parts.append("No files with duplicate categories found.\n")
+    
+    report = "".join(parts)
     
     print("\nAnalysis complete! Detailed report:")
     print(report)
@@ -470,19 +602,43 @@ def process_files_in_category(category_name, fix_issues=False):
         except Exception as e:
             print(f"Error saving report: {e}")
 
-def process_user_categories(username, fix_issues=False):
-    """Process categories created by a specific user."""
-    # Get user
-    user = pywikibot.User(site, username)
-    
-    # Get user's contributions in category namespace
-    contributions = user.contributions(namespaces=14)  # Namespace 14 = Category
+def analyze_user_category(category_title):
+    """Get a (title, parent categories) tuple for a category."""
+    return category_title, get_parent_categories(get_category(category_title))
+
+def fetch_created_categories(username):
+    """Get the titles of the categories a user created.
     
-    # Extract unique categories
+    The contributions are filtered by the API to page creations in the
+    category namespace, so the user's other edits aren't transferred.
+    """
     categories = set()
-    for timestamp, page, _, _ in contributions:
-        if page.exists() and page.namespace() == 14:  # Category namespace
-            categories.add(page.title())
+    params = {
+        'action': 'query',
+        'list': 'usercontribs',
+        'ucuser': username,
+        'ucnamespace': 14,  # Namespace 14 = Category
+        'ucshow': 'new',
+        'ucprop': 'title',
+        'uclimit': 'max',
+        'formatversion': 2,
+    }
+    
+    while True:
+        data = site.simple_request(**params).submit()
+        for contribution in data.get('query', {}).get('usercontribs', []):
+            categories.add(contribution['title'])
+        
+        if 'continue' not in data:
+            break
+        params.update(data['continue'])
+    
+    return categories
+
+def process_user_categories(username, fix_issues=False, max_workers=MAX_WORKERS):
+    """Process categories created by a specific user."""
+    # Get the categories the user created
+    categories = fetch_created_categories(username)
     
     if not categories:
         print(f"No categories found created by {username}")
@@ -497,42 +653,33 @@ def process_user_categories(username, fix_issues=False):
         'empty_categories': []
     }
     
-    for i, category_title in enumerate(categories):
-        if i % 10 == 0:
-            print(f"Analyzing category {i+1}/{len(categories)}: {category_title}")
-        
-        category = pywikibot.Category(site, category_title)
-        
-        # Check if category is orphaned (no parent categories)
-        parent_categories = get_parent_categories(category)
-        if not parent_categories:
-            results['orphaned_categories'].append(category_title)
-        
-        # Check for missing parent categories
-        for parent in parent_categories:
-            parent_page = pywikibot.Category(site, f"Category:{parent}")
-            if not parent_page.exists():
-                results['missing_parent_categories'].append((category_title, parent))
-        
-        # Check if category is empty
-        has_articles = False
-        has_subcategories = False
+    # (category, parent) pairs, checked for existence after the loop
+    parent_links = []
+    
+    # Analyze the categories concurrently; results come back in order
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        analyses = executor.map(analyze_user_category, categories)
         
-        try:
-            # Check for articles
-            for _ in category.articles(recurse=False):
-                has_articles = True
-                break
+        for i, (category_title, parent_categories) in enumerate(analyses):
+            if i % 10 == 0:
+                print(f"Analyzed category {i+1}/{len(categories)}: {category_title}")
             
-            # Check for subcategories
-            for _ in category.subcategories():
-                has_subcategories = True
-                break
+            # Check if category is orphaned (no parent categories)
+            if not parent_categories:
+                results['orphaned_categories'].append(category_title)
             
-            if not has_articles and not has_subcategories:
-                results['empty_categories'].append(category_title)
-        except Exception as e:
-            print(f"Error checking if {category_title} is empty: {e}")
+            # Remember parent links; their existence is checked in bulk below
+            for parent in parent_categories:
+                parent_links.append((category_title, parent))
+    
+    # Check for empty categories
+    results['empty_categories'] = find_empty_categories(list(categories))
+    
+    # Check for missing parent categories
+    parent_exists = batch_exists(f"Category:{parent}" for _, parent in parent_links)
+    for category_title, parent in parent_links:
+        if not parent_exists[f"Category:{parent}"]:
+            results['missing_parent_categories'].append((category_title, parent))
     
     # Display results
     print("\n=== Category Analysis Results ===\n")
@@ -550,7 +697,7 @@ def process_user_categories(username, fix_issues=False):
             
             for category_title in results['orphaned_categories']:
                 # Skip maintenance categories or user categories
-                if 'maintenance' in category_title.lower() or '/pwb' in category_title:
+                if is_skipped_category(category_title):
                     continue
                 
                 # Get suggested parent categories
@@ -563,31 +710,33 @@ def process_user_categories(username, fix_issues=False):
             print(f"Fixed {orphan_fixed} orphaned categories")
     
     # Create detailed report
-    report = f"= Category Analysis for User:{username} =\n\n"
+    parts = [f"= Category Analysis for User:{username} =\n\n"]
     
     # Orphaned categories
-    report += "== Orphaned Categories ==\n"
+    parts.append("== Orphaned Categories ==\n")
     if results['orphaned_categories']:
         for category in results['orphaned_categories']:
-            report += f"* [[:{category}]]\n"
+            parts.append(f"* [[:{category}]]\n")
     else:
-        report += "No orphaned categories found.\n"
+        parts.append("No orphaned categories found.\n")
     
     # Missing parent categories
-    report += "\n== Missing Parent Categories ==\n"
+    parts.append("\n== Missing Parent Categories ==\n")
     if results['missing_parent_categories']:
         for category, missing_parent in results['missing_parent_categories']:
-            report += f"* [[:{category}]] links to non-existent category: {missing_parent}\n"
+            parts.append(f"* [[:{category}]] links to non-existent category: {missing_parent}\n")
     else:
-        report += "No missing parent categories found.\n"
+        parts.append("No missing parent categories found.\n")
     
     # Empty categories
-    report += "\n== Empty Categories ==\n"
+    parts.append("\n== Empty Categories ==\n")
     if results['empty_categories']:
         for category in results['empty_categories']:
-            report += f"* [[:{category}]] has no articles or subcategories\n"
+            parts.append(f"* [[:{category}]] has no articles or subcategories\n")
     else:
-        report += "No empty categories found.\n"
+        parts.append("No empty categories found.\n")
+    
+    report = "".join(parts)
     
     print("\nAnalysis complete! Detailed report:")
     print(report)
@@ -606,10 +755,20 @@ def process_user_categories(username, fix_issues=False):
         except Exception as e:
             print(f"Error saving report: {e}")
 
+def category_key(category_name):
+    """Get the title of a category name given with or without prefix."""
+    if not category_name.startswith('Category:'):
+        category_name = f'Category:{category_name}'
+    return category_name
+
 def interactive_mode():
     """Interactive mode for repairing categories."""
     print("=== PWB Category Repair Tool ===")
     
+    # File categories found by analyzing a category without fixing it,
+    # reused when the files of that category are checked next
+    analyzed_files = {}
+    
     while True:
         print("\nOptions:")
         print("1. Analyze category structure")
@@ -622,12 +781,15 @@ def interactive_mode():
         if choice == '1':
             category_name = input("Enter category name to analyze (with or without 'Category:' prefix): ").strip()
             fix = input("Fix issues automatically? (y/n): ").lower() == 'y'
-            process_category(category_name, fix)
+            results = process_category(category_name, fix)
+            if results and not fix:
+                analyzed_files[category_key(category_name)] = results['file_categories']
         
         elif choice == '2':
             category_name = input("Enter category name (with or without 'Category:' prefix): ").strip()
             fix = input("Fix issues automatically? (y/n): ").lower() == 'y'
-            process_files_in_category(category_name, fix)
+            precomputed = analyzed_files.pop(category_key(category_name), None)
+            process_files_in_category(category_name, fix, precomputed)
         
         elif choice == '3':
             username = input("Enter username: ").strip()
@@ -654,6 +816,8 @@ def main():
     
     # Additional arguments
     parser.add_argument('--fix', action='store_true', help='Fix issues automatically')
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS,
+                        help=f'Number of categories analyzed at once with --user (default: {MAX_WORKERS})')
     
     args = parser.parse_args()
     
@@ -664,8 +828,7 @@ def main():
     elif args.category:
         process_files_in_category(args.category, args.fix)
     elif args.user:
-        process_user_categories(args.user, args.fix)
+        process_user_categories(args.user, args.fix, args.workers)
 
 if __name__ == "__main__":
     main()
-    files = list(category.
\ No newline at end of file
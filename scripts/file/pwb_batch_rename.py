@@ -7,7 +7,9 @@ import re
 import csv
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from itertools import chain, islice
 
 """
 pwb_batch_rename.py - Batch rename files on Wikimedia Commons
@@ -31,25 +33,34 @@ import argparse
 # Initialize site
 site = pywikibot.Site('commons', 'commons')
 
-def rename_file(old_name, new_name, reason):
-    """Rename a file from old_name to new_name with given reason."""
+# Number of CSV rows read at a time, and of renames run at once
+RENAME_BATCH_SIZE = 50
+MAX_WORKERS = 4
+
+# Number of pages per API request when loading page info
+API_BATCH_SIZE = 50
+
+def get_file_page(name):
+    """Get the page of a file name, with or without "File:" prefix."""
+    if not name.startswith('File:'):
+        name = f'File:{name}'
+    return pywikibot.Page(site, name)
+
+def move_file(old_page, new_page, reason):
+    """Move old_page to new_page with given reason.
+    
+    Pages whose info is already loaded, e.g. by site.preloadpages(), are
+    checked without further API requests.
+    """
+    old_name = old_page.title()
+    new_name = new_page.title()
     try:
-        # Ensure filenames have "File:" prefix
-        if not old_name.startswith('File:'):
-            old_name = f'File:{old_name}'
-        if not new_name.startswith('File:'):
-            new_name = f'File:{new_name}'
-        
-        # Create page objects
-        old_page = pywikibot.Page(site, old_name)
-        
         # Check if old file exists
         if not old_page.exists():
             print(f"Error: {old_name} does not exist")
             return False
         
         # Check if new file already exists
-        new_page = pywikibot.Page(site, new_name)
         if new_page.exists():
             print(f"Error: {new_name} already exists")
             return False
@@ -63,30 +74,65 @@ def rename_file(old_name, new_name, reason):
         print(f"Error renaming {old_name} to {new_name}: {e}")
         return False
 
-def rename_by_pattern(category, old_pattern, new_pattern, reason):
-    """Rename files in category using search and replace patterns."""
+def rename_file(old_name, new_name, reason):
+    """Rename a file from old_name to new_name with given reason."""
+    try:
+        old_page = get_file_page(old_name)
+        new_page = get_file_page(new_name)
+    except pywikibot.exceptions.Error as e:
+        print(f"Error renaming {old_name} to {new_name}: {e}")
+        return False
+    
+    return move_file(old_page, new_page, reason)
+
+def pattern_renamer(regex, new_pattern):
+    """Get a function renaming filenames that match regex to new_pattern."""
+    def rename(file_name):
+        if not regex.search(file_name):
+            return None
+        return regex.sub(new_pattern, file_name)
+    return rename
+
+def prefix_renamer(prefix):
+    """Get a function adding prefix to filenames."""
+    def rename(file_name):
+        return prefix + file_name
+    return rename
+
+def suffix_renamer(suffix):
+    """Get a function adding suffix to filenames, before the extension.
+    
+    Filenames without an extension are left alone.
+    """
+    def rename(file_name):
+        stem, dot, ext = file_name.rpartition('.')
+        if not stem or not ext:
+            return None
+        return stem + suffix + dot + ext
+    return rename
+
+def rename_by_pattern(category, renamer, reason):
+    """Rename files in category using a renaming function.
+    
+    renamer gets each filename without "File:" prefix and returns the new
+    filename, or None to leave the file alone; see pattern_renamer,
+    prefix_renamer and suffix_renamer.
+    """
     # Get all files in the category
     files = pagegenerators.CategorizedPageGenerator(
-        pywikibot.Category(site, category), recurse=False
+        pywikibot.Category(site, category), recurse=False, namespaces=[6]  # Namespace 6 = File
     )
     
     renamed_count = 0
     error_count = 0
     
-    # Compile regex pattern
-    regex = re.compile(old_pattern)
-    
     for file_page in files:
-        if file_page.namespace() != 6:  # Only process files
-            continue
-        
         old_name = file_page.title()
         file_name = old_name.split(':', 1)[1]  # Remove "File:" prefix for pattern matching
         
-        # Check if pattern matches
-        if regex.search(file_name):
-            # Create new filename
-            new_file_name = regex.sub(new_pattern, file_name)
+        # Create new filename, if the file is to be renamed
+        new_file_name = renamer(file_name)
+        if new_file_name is not None:
             new_name = f"File:{new_file_name}"
             
             print(f"Renaming {old_name} to {new_name}")
@@ -104,32 +150,86 @@ def rename_by_pattern(category, old_pattern, new_pattern, reason):
     
     return renamed_count, error_count
 
-def rename_from_csv(csv_file, reason):
-    """Rename files according to a CSV file with old and new filenames."""
-    if not os.path.exists(csv_file):
-        print(f"Error: CSV file {csv_file} not found")
-        return 0, 0
+def read_renames(csv_reader):
+    """Yield (old name, new name) pairs from CSV rows, skipping invalid rows."""
+    for row in csv_reader:
+        if len(row) < 2:
+            print(f"Warning: Skipping invalid row in CSV: {row}")
+            continue
+        yield row[0], row[1]
+
+def independent_groups(pairs):
+    """Split (old page, new page) pairs into runs that can be moved at once.
+    
+    Consecutive pairs stay in one run as long as no title appears in more
+    than one of them; a pair using a title of the run, e.g. B -> C after
+    A -> B, starts the next run.
+    """
+    group = []
+    titles = set()
+    for old_page, new_page in pairs:
+        pair_titles = {old_page.title(), new_page.title()}
+        if titles & pair_titles:
+            yield group
+            group = []
+            titles = set()
+        group.append((old_page, new_page))
+        titles |= pair_titles
+    if group:
+        yield group
+
+def rename_from_csv(csv_file, reason, batch_size=RENAME_BATCH_SIZE):
+    """Rename files according to a CSV file with old and new filenames.
     
+    The CSV file is read batch_size rows at a time. Within a batch, runs of
+    rows that share no titles are checked with batched API requests and
+    then renamed concurrently, one run after the other; rows that depend on
+    an earlier row, like A -> B followed by B -> C, are thus still renamed
+    after it. Runs are only as long as the consecutive independent rows, so
+    a manifest of chained renames is processed one row at a time.
+    """
     renamed_count = 0
     error_count = 0
     
-    with open(csv_file, 'r', encoding='utf-8') as f:
-        csv_reader = csv.reader(f)
-        for row in csv_reader:
-            if len(row) < 2:
-                print(f"Warning: Skipping invalid row in CSV: {row}")
-                continue
-            
-            old_name, new_name = row[0], row[1]
-            
-            print(f"Renaming {old_name} to {new_name}")
-            
-            # Perform rename
-            if rename_file(old_name, new_name, reason):
-                renamed_count += 1
-            else:
-                error_count += 1
-            
+    def rename(pages):
+        old_page, new_page = pages
+        print(f"Renaming {old_page.title()} to {new_page.title()}")
+        return move_file(old_page, new_page, reason)
+    
+    try:
+        with open(csv_file, 'r', encoding='utf-8', newline='') as f:
+            renames = read_renames(csv.reader(f))
+            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+                while True:
+                    batch = list(islice(renames, batch_size))
+                    if not batch:
+                        break
+                    
+                    pairs = []
+                    for old_name, new_name in batch:
+                        try:
+                            pairs.append((get_file_page(old_name), get_file_page(new_name)))
+                        except pywikibot.exceptions.Error as e:
+                            print(f"Error renaming {old_name} to {new_name}: {e}")
+                            error_count += 1
+                    
+                    for group in independent_groups(pairs):
+                        # Load whether the pages exist, API_BATCH_SIZE pages per
+                        # request, after the moves of the previous run; only the
+                        # page info is needed, not the text
+                        for _ in site.preloadpages(list(chain.from_iterable(group)),
+                                                   groupsize=API_BATCH_SIZE, content=False):
+                            pass
+                        
+                        # Perform renames
+                        for renamed in executor.map(rename, group):
+                            if renamed:
+                                renamed_count += 1
+                            else:
+                                error_count += 1
+    except FileNotFoundError:
+        print(f"Error: CSV file {csv_file} not found")
+    
     return renamed_count, error_count
 
 def interactive_mode():
@@ -164,22 +264,28 @@ def interactive_mode():
     if option == "1":
         search_text = input("Enter text to search for: ")
         replace_text = input("Enter replacement text: ")
-        old_pattern = re.escape(search_text)
-        new_pattern = replace_text
+        renamer = pattern_renamer(re.compile(re.escape(search_text)), replace_text)
+        settings = [f"Search text: {search_text}", f"Replacement text: {replace_text}"]
     
     elif option == "2":
         prefix = input("Enter prefix to add: ")
-        old_pattern = r"^(.+)$"
-        new_pattern = f"{prefix}\\1"
+        renamer = prefix_renamer(prefix)
+        settings = [f"Prefix: {prefix}"]
     
     elif option == "3":
         suffix = input("Enter suffix to add (before extension): ")
-        old_pattern = r"^(.+)(\..+)$"
-        new_pattern = f"\\1{suffix}\\2"
+        renamer = suffix_renamer(suffix)
+        settings = [f"Suffix: {suffix}"]
     
     elif option == "4":
-        old_pattern = input("Enter regex search pattern: ")
+        try:
+            regex = re.compile(input("Enter regex search pattern: "))
+        except re.error as e:
+            print(f"Invalid regex pattern: {e}")
+            return 0, 0
         new_pattern = input("Enter regex replacement pattern: ")
+        renamer = pattern_renamer(regex, new_pattern)
+        settings = [f"Search pattern: {regex.pattern}", f"Replace pattern: {new_pattern}"]
     
     else:
         print("Invalid option selected")
@@ -188,8 +294,8 @@ def interactive_mode():
     # Confirm
     print("\nReview your settings:")
     print(f"Category: {category}")
-    print(f"Search pattern: {old_pattern}")
-    print(f"Replace pattern: {new_pattern}")
+    for setting in settings:
+        print(setting)
     print(f"Reason: {reason}")
     
     if input("\nProceed with batch rename? (y/n): ").lower() != 'y':
@@ -197,13 +303,13 @@ def interactive_mode():
         return 0, 0
     
     # Perform renames
-    return rename_by_pattern(category, old_pattern, new_pattern, reason)
+    return rename_by_pattern(category, renamer, reason)
 
 def create_report(renamed_count, error_count):
     """Create a report of the renaming operation."""
     total = renamed_count + error_count
     
-    report = f"""= File Rename Operation Report =
+    parts = [f"""= File Rename Operation Report =
 
 == Summary ==
 * Operation date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
@@ -211,20 +317,30 @@ def create_report(renamed_count, error_count):
 * Successfully renamed: {renamed_count}
 * Errors encountered: {error_count}
 
-"""
+"""]
     
     if renamed_count > 0:
         success_rate = (renamed_count / total) * 100 if total > 0 else 0
-        report += f"Operation completed with {success_rate:.1f}% success rate.\n"
+        parts.append(f"Operation completed with {success_rate:.1f}% success rate.\n")
     
-    report += f"\nReport generated by pwb_batch_rename.py"
+    parts.append(f"\nReport generated by pwb_batch_rename.py")
+    report = "".join(parts)
     
     # Save report to user page
+    def report_saved(page, error):
+        if error:
+            print(f"Error saving report: {error}")
+            print("Report content:")
+            print(report)
+        else:
+            print(f"Report saved to {page.title()}")
+    
     try:
         user_page = pywikibot.Page(site, 'User:YOUR_USERNAME/pwb/Rename_Report')
         user_page.text = report
-        user_page.save(summary="pwb: File rename operation report")
-        print(f"Report saved to {user_page.title()}")
+        # Saved in the background; pywikibot completes queued saves on exit
+        user_page.save(summary="pwb: File rename operation report", asynchronous=True,
+                       callback=report_saved)
     except Exception as e:
         print(f"Error saving report: {e}")
         print("Report content:")
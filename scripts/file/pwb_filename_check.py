@@ -4,42 +4,48 @@
 import pywikibot
 from pywikibot import pagegenerators
 import re
+import argparse
 
 # Site and category definition
 site = pywikibot.Site('commons', 'commons')
 category = pywikibot.Category(site, 'Category:YOUR_UPLOADS_CATEGORY')
 
-# Generator to process files in the category
-file_generator = pagegenerators.CategorizedPageGenerator(category, recurse=False)
+# Generator to process files in the category; only the titles are needed,
+# so the pages aren't loaded
+file_generator = pagegenerators.CategorizedPageGenerator(
+    category, recurse=False, namespaces=[6]  # Namespace 6 = File namespace
+)
 
 # Lists for files matching different criteria
-non_matching_files = []  # Files without "--" in filename
-long_files = []  # Files with too long filename
+non_matching_files = []  # Titles of files without "--" in filename
+long_files = []  # (title, length) of files with too long filename
 
 # Process each file
-def main():
+def main(verbose=False):
+    # The generator only yields existing files, so no checks are needed
     for file_page in file_generator:
-        if not file_page.exists() or file_page.namespace() != 6:  # Namespace 6 = File namespace
-            continue
-
         file_title = file_page.title()
-        print(f"Checking file: {file_title}")
+        if verbose:
+            print(f"Checking file: {file_title}")
 
         # Check if the filename contains the characters "--"
         if "--" not in file_title:
             print(f"File does not contain '--': {file_title}")
-            non_matching_files.append(f"* [[:{file_title}]]\n")
-        else:
+            non_matching_files.append(file_title)
+        elif verbose:
             print(f"File is OK (contains '--'): {file_title}")
 
         # Check if the filename is too long (more than 100 characters)
-        if len(file_title) > 100:
+        name_len = len(file_title)
+        if name_len > 100:
             print(f"Filename too long: {file_title}")
-            long_files.append(f"* [[:{file_title}]] ({len(file_title)} characters)\n")
+            long_files.append((file_title, name_len))
 
     # Count files listed in the report
     file_count = len(non_matching_files) + len(long_files)
     file_count_str = str(file_count) if file_count > 0 else "none"
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description='Check filenames in a category on Wikimedia Commons')
+    parser.add_argument('--verbose', action='store_true', help='Also print files without issues')
+    main(parser.parse_args().verbose)
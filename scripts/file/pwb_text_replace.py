@@ -26,40 +26,40 @@ def create_report(category_name, old_text, new_text, results):
     Returns:
         str: Formatted report in wiki markup
     """
-    report = f"""= Text Replacement Report =
+    successful = [r for r in results if r.get('success')]
+    failed = [r for r in results if not r.get('success')]
+    
+    parts = [f"""= Text Replacement Report =
 
 == Summary ==
 * Category: {category_name}
 * Text to replace: `{old_text}`
 * Replacement text: `{new_text}`
 * Total files processed: {len(results)}
-* Successful replacements: {sum(1 for r in results if r.get('success'))}
-* Failed replacements: {sum(1 for r in results if not r.get('success'))}
+* Successful replacements: {len(successful)}
+* Failed replacements: {len(failed)}
 
 == Replacement Details ==
-"""
+"""]
     
     # Successful replacements
-    report += "\n=== Successful Replacements ===\n"
-    successful = [r for r in results if r.get('success')]
+    parts.append("\n=== Successful Replacements ===\n")
     if successful:
-        for result in successful:
-            report += f"* [[:{result['title']}]]\n"
+        parts.extend(f"* [[:{result['title']}]]\n" for result in successful)
     else:
-        report += "No successful replacements.\n"
+        parts.append("No successful replacements.\n")
     
     # Failed replacements
-    report += "\n=== Failed Replacements ===\n"
-    failed = [r for r in results if not r.get('success')]
+    parts.append("\n=== Failed Replacements ===\n")
     if failed:
-        for result in failed:
-            report += f"* [[:{result['title']}]]: {result.get('error', 'Unknown error')}\n"
+        parts.extend(f"* [[:{result['title']}]]: {result.get('error', 'Unknown error')}\n"
+                     for result in failed)
     else:
-        report += "No failed replacements.\n"
+        parts.append("No failed replacements.\n")
     
-    report += f"\nReport generated by pwb_text_replace.py on ~~~~~"
+    parts.append(f"\nReport generated by pwb_text_replace.py on ~~~~~")
     
-    return report
+    return "".join(parts)
 
 def save_report(report):
     """
@@ -68,11 +68,20 @@ def save_report(report):
     Args:
         report (str): Report content to save
     """
+    def report_saved(page, error):
+        if error:
+            print(f"Error saving report: {error}")
+            print("Report content:")
+            print(report)
+        else:
+            print(f"Report saved to {page.title()}")
+    
     try:
         user_page = pywikibot.Page(site, 'User:YOUR_USERNAME/pwb/Text_Replace_Report')
         user_page.text = report
-        user_page.save(summary="pwb: Updated text replacement report")
-        print(f"Report saved to {user_page.title()}")
+        # Saved in the background; pywikibot completes queued saves on exit
+        user_page.save(summary="pwb: Updated text replacement report", asynchronous=True,
+                       callback=report_saved)
     except Exception as e:
         print(f"Error saving report: {e}")
         print("Report content:")
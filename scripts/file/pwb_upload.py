@@ -4,6 +4,7 @@
 import pywikibot
 import os
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 """
@@ -27,6 +28,17 @@ Usage:
 # Site configuration
 site = pywikibot.Site('commons', 'commons')
 
+# Number of files uploaded at once; pywikibot's write throttle still
+# spaces out the upload requests themselves
+MAX_WORKERS = 4
+
+# File extensions uploaded when no types are given
+DEFAULT_FILE_TYPES = frozenset({'jpg', 'jpeg', 'png', 'gif', 'svg', 'tif', 'tiff'})
+
+# Files larger than this are uploaded in chunks of this size, so a
+# failed request only repeats one chunk instead of the whole file
+UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+
 # Default file description template
 DEFAULT_DESCRIPTION = """== {{int:filedesc}} ==
 {{Information
@@ -109,6 +121,7 @@ def upload_file(file_path, site, description=None):
                 source_filename=file_path,
                 comment="Batch upload",
                 text=upload_description,
+                chunk_size=UPLOAD_CHUNK_SIZE,
                 ignore_warnings=False
             )
             
@@ -138,8 +151,8 @@ def process_directory(directory, file_types=None, description=None):
     
     Args:
         directory (str): Path to directory with files to upload
-        file_types (list, optional): Allowed file extensions
-        description (str, optional): Custom file description
+        file_types (iterable, optional): Allowed file extensions
+        description (str, optional): Custom file description template
     
     Returns:
         list: List of upload results
@@ -149,26 +162,33 @@ def process_directory(directory, file_types=None, description=None):
         print(f"Error: {directory} is not a valid directory")
         return []
     
-    # Default file types if not specified
+    # Default file types if not specified, normalized to lowercase
     if file_types is None:
-        file_types = ['jpg', 'jpeg', 'png', 'gif', 'svg', 'tif', 'tiff']
-    
-    # Normalize file types to lowercase
-    file_types = [ft.lower().lstrip('.') for ft in file_types]
+        file_types = DEFAULT_FILE_TYPES
+    else:
+        file_types = frozenset(ft.lower().lstrip('.') for ft in file_types)
     
     # Collect files to upload
     files_to_upload = []
-    for filename in os.listdir(directory):
-        # Check file extension
-        file_ext = os.path.splitext(filename)[1].lower().lstrip('.')
-        if file_ext in file_types:
-            files_to_upload.append(os.path.join(directory, filename))
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if not entry.is_file():
+                continue
+            # Check file extension
+            name = entry.name
+            dot = name.rfind('.')
+            if dot > 0 and name[dot + 1:].lower() in file_types:
+                files_to_upload.append(entry.path)
+    
+    # The description doesn't depend on the file, so it is generated once
+    description = generate_file_description(None, description)
     
-    # Upload files
-    upload_results = []
-    for file_path in files_to_upload:
-        result = upload_file(file_path, site, description)
-        upload_results.append(result)
+    # Upload files concurrently; results keep the order of the files
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        upload_results = list(executor.map(
+            lambda file_path: upload_file(file_path, site, description),
+            files_to_upload
+        ))
     
     # Generate report
     report = create_report(upload_results)
@@ -186,7 +206,10 @@ def create_report(upload_results):
     Returns:
         str: Formatted report in wiki markup
     """
-    report = """= Batch Upload Report =
+    successful_uploads = [r for r in upload_results if r['success']]
+    failed_uploads = [r for r in upload_results if not r['success']]
+    
+    parts = ["""= Batch Upload Report =
 
 == Summary ==
 * Total files processed: {}
@@ -194,33 +217,26 @@ def create_report(upload_results):
 * Failed uploads: {}
 
 == Upload Details ==
-""".format(
-        len(upload_results),
-        sum(1 for r in upload_results if r['success']),
-        sum(1 for r in upload_results if not r['success'])
-    )
+""".format(len(upload_results), len(successful_uploads), len(failed_uploads))]
     
     # Successful uploads
-    report += "\n=== Successful Uploads ===\n"
-    successful_uploads = [r for r in upload_results if r['success']]
+    parts.append("\n=== Successful Uploads ===\n")
     if successful_uploads:
-        for result in successful_uploads:
-            report += f"* [[File:{result['filename']}]]\n"
+        parts.extend(f"* [[File:{result['filename']}]]\n" for result in successful_uploads)
     else:
-        report += "No files uploaded successfully.\n"
+        parts.append("No files uploaded successfully.\n")
     
     # Failed uploads
-    report += "\n=== Failed Uploads ===\n"
-    failed_uploads = [r for r in upload_results if not r['success']]
+    parts.append("\n=== Failed Uploads ===\n")
     if failed_uploads:
-        for result in failed_uploads:
-            report += f"* {result['filename']}: {result.get('error', 'Unknown error')}\n"
+        parts.extend(f"* {result['filename']}: {result.get('error', 'Unknown error')}\n"
+                     for result in failed_uploads)
     else:
-        report += "No upload failures.\n"
+        parts.append("No upload failures.\n")
     
-    report += f"\nReport generated by pwb_upload.py on ~~~~~"
+    parts.append(f"\nReport generated by pwb_upload.py on ~~~~~")
     
-    return report
+    return "".join(parts)
 
 def save_report(report):
     """
@@ -229,11 +245,20 @@ def save_report(report):
     Args:
         report (str): Report content to save
     """
+    def report_saved(page, error):
+        if error:
+            print(f"Error saving report: {error}")
+            print("Report content:")
+            print(report)
+        else:
+            print(f"Report saved to {page.title()}")
+    
     try:
         user_page = pywikibot.Page(site, 'User:YOUR_USERNAME/pwb/Upload_Report')
         user_page.text = report
-        user_page.save(summary="pwb: Updated batch upload report")
-        print(f"Report saved to {user_page.title()}")
+        # Saved in the background; pywikibot completes queued saves on exit
+        user_page.save(summary="pwb: Updated batch upload report", asynchronous=True,
+                       callback=report_saved)
     except Exception as e:
         print(f"Error saving report: {e}")
         print("Report content:")